@@ -4,7 +4,24 @@ from .custom_field import (
     ReadOnlyQuerySetField,
     ReadOnlyQueryStrField,
 )
-from .django_to_proto import django_to_proto, django_to_proto_bytes
+from .concurrency import (
+    ConcurrentUpdateError,
+    retry_on_conflict,
+    retrying_on_conflict,
+)
+from .context import conversion_context
+from .delta import django_to_proto_delta
+from .django_to_dict import django_to_dict
+from .django_to_proto import (
+    django_to_proto,
+    django_to_proto_bytes,
+    django_to_proto_many,
+    django_to_proto_page,
+)
 from .gen_proto import gen_proto_for_models
-from .proto_to_django import proto_to_django
+from .proto_to_django import (
+    proto_to_django,
+    proto_to_django_many,
+    plan_proto_to_django,
+)
 from .registry import register_model, ProtoMeta
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.core import checks
+
+
+class DjpbConfig(AppConfig):
+    name = "djpb"
+
+    def ready(self):
+        from .backend import check_protobuf_backend, warn_protobuf_backend
+        from .registry import check_registry, freeze_registry
+
+        checks.register(check_protobuf_backend)
+        checks.register(check_registry)
+        warn_protobuf_backend()
+        # fail at startup instead of in the middle of a request
+        freeze_registry()
@@ -0,0 +1,38 @@
+import logging
+
+from django.core import checks
+from google.protobuf.internal import api_implementation
+
+logger = logging.getLogger(__name__)
+
+# "upb", "cpp" or "python"
+PROTOBUF_BACKEND = api_implementation.Type()
+
+# On the native backends, a single keyword-constructor call is much cheaper than a `setattr()` per field.
+# On the pure-python backend, the constructor calls `setattr()` for each keyword anyway, so it's slower.
+USE_KWARGS_CONSTRUCTOR = PROTOBUF_BACKEND in ("upb", "cpp")
+
+PURE_PYTHON_WARNING = (
+    "djpb is running on the pure-python protobuf backend, which is many times slower than "
+    "the native (upb / cpp) backends. Check that your protobuf package ships native wheels "
+    "for this platform, and that PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION isn't set to 'python'."
+)
+
+
+def check_protobuf_backend(app_configs=None, **kwargs):
+    if PROTOBUF_BACKEND != "python":
+        return []
+    return [
+        checks.Warning(
+            PURE_PYTHON_WARNING,
+            hint=f"Active protobuf backend: {PROTOBUF_BACKEND!r}.",
+            id="djpb.W001",
+        )
+    ]
+
+
+def warn_protobuf_backend():
+    if PROTOBUF_BACKEND == "python":
+        logger.warning(PURE_PYTHON_WARNING)
+    else:
+        logger.info(f"djpb is using the {PROTOBUF_BACKEND!r} protobuf backend.")
@@ -0,0 +1,118 @@
+import importlib
+import logging
+import typing
+
+from django.conf import settings
+
+from .registry import MODEL_TO_PROTO_CLS, get_proto_meta
+from .serializers import (
+    SERIALIZERS,
+    DEFAULT_SERIALIZER,
+    FieldSerializer,
+    resolve_serializer,
+)
+from .stubs import DjModel, DjModelType, ProtoMsg, ProtoMsgType
+from .util import (
+    build_django_field_map,
+    resolve_django_field_type,
+    none_value_error,
+)
+
+# to avoid circular import
+if False:
+    from .serializers import SaveNode
+
+logger = logging.getLogger(__name__)
+
+
+class CompiledConverter(typing.NamedTuple):
+    to_proto: typing.Callable[[DjModel, ProtoMsg], None]
+    to_django: typing.Callable[["SaveNode", ProtoMsg], None]
+
+
+_COMPILED: typing.Optional[
+    typing.Dict[typing.Tuple[DjModelType, ProtoMsgType], CompiledConverter]
+] = None
+
+
+def get_compiled_converter(
+    django_model: DjModelType, proto_cls: ProtoMsgType
+) -> typing.Optional[CompiledConverter]:
+    global _COMPILED
+    if _COMPILED is None:
+        _COMPILED = load_compiled_converters()
+    return _COMPILED.get((django_model, proto_cls))
+
+
+def load_compiled_converters() -> typing.Dict[
+    typing.Tuple[DjModelType, ProtoMsgType], CompiledConverter
+]:
+    """
+    Load the converters generated by `manage.py gen_proto --converters`,
+    from the module named by `settings.DJPB_CONVERTERS_MODULE`.
+
+    Converters whose schema fingerprint doesn't match the current models & protobuf classes are skipped.
+    """
+    from .gen_converters import schema_fingerprint
+
+    module_name = getattr(settings, "DJPB_CONVERTERS_MODULE", None)
+    if not module_name:
+        return {}
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        logger.warning(
+            f"Failed to import the djpb converters module {module_name!r}.",
+            exc_info=True,
+        )
+        return {}
+
+    compiled = {}
+    for django_model, proto_classes in MODEL_TO_PROTO_CLS.items():
+        for proto_cls in proto_classes:
+            # paginated relations are only supported by the generic conversion loops
+            if get_proto_meta(proto_cls).page_sizes:
+                continue
+            key = (django_model._meta.label, proto_cls.DESCRIPTOR.full_name)
+            try:
+                fingerprint, factory = module.CONVERTERS[key]
+            except KeyError:
+                continue
+            try:
+                up_to_date = fingerprint == schema_fingerprint(django_model, proto_cls)
+            except ValueError:
+                up_to_date = False
+            if not up_to_date:
+                logger.warning(
+                    f"The generated djpb converter for {key!r} is out of date, "
+                    f"please re-run `manage.py gen_proto --converters`."
+                )
+                continue
+            compiled[django_model, proto_cls] = CompiledConverter(
+                *factory(django_model, proto_cls, get_proto_meta(proto_cls).custom)
+            )
+    return compiled
+
+
+#
+# Helpers used by the generated code
+#
+
+
+def to_proto_serializer(django_model: DjModelType, field_name: str) -> FieldSerializer:
+    field_map = build_django_field_map(django_model)
+    return resolve_serializer(
+        resolve_django_field_type(django_model, field_map, field_name)
+    )
+
+
+def to_django_serializer(django_model: DjModelType, field_name: str) -> FieldSerializer:
+    field_map = build_django_field_map(django_model)
+    django_field_type = resolve_django_field_type(django_model, field_map, field_name)
+    return SERIALIZERS.get(django_field_type, DEFAULT_SERIALIZER)
+
+
+def none_error(django_model: DjModelType, field_name: str):
+    field_map = build_django_field_map(django_model)
+    django_field_type = resolve_django_field_type(django_model, field_map, field_name)
+    raise none_value_error(django_field_type, django_model, field_name)
@@ -0,0 +1,52 @@
+import functools
+import typing
+
+from .stubs import DjModel
+
+T = typing.TypeVar("T")
+
+
+class ConcurrentUpdateError(Exception):
+    """
+    Raised when a versioned object (see `ProtoMeta.version_field`) was changed or deleted
+    by someone else since it was read.
+    """
+
+    def __init__(self, django_obj: DjModel, version_field: str, expected_version):
+        self.django_obj = django_obj
+        self.version_field = version_field
+        self.expected_version = expected_version
+        super().__init__(
+            f"{django_obj._meta.label}(pk={django_obj.pk!r}) was modified concurrently: "
+            f"expected {version_field}={expected_version!r}."
+        )
+
+
+def retry_on_conflict(
+    func: typing.Callable[..., T], *args, max_attempts: int = 3, **kwargs
+) -> T:
+    """
+    Call `func(*args, **kwargs)`, calling it again if it raises `ConcurrentUpdateError`.
+
+    `func` must re-read the objects it updates on every call (e.g. `proto_to_django()` without a `django_obj`),
+    and must not be called inside an outer transaction, which would keep seeing the same data.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return func(*args, **kwargs)
+        except ConcurrentUpdateError:
+            if attempt + 1 >= max_attempts:
+                raise
+
+
+def retrying_on_conflict(max_attempts: int = 3):
+    """Decorator version of `retry_on_conflict()`."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return retry_on_conflict(func, *args, max_attempts=max_attempts, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,89 @@
+import contextlib
+import dataclasses
+import typing
+from contextvars import ContextVar
+
+from .stubs import ProtoMsg
+
+MemoKey = typing.Tuple[typing.Any, typing.Any, typing.Any, typing.Optional[str]]
+
+
+@dataclasses.dataclass
+class ConversionContext:
+    """
+    State shared by every (nested) conversion made during a single top-level call.
+
+    Serializers and custom fields call `django_to_proto()` recursively,
+    so the context is carried by a context variable instead of function arguments.
+    """
+
+    # (django model, pk, proto class, database alias) -> an already serialized message,
+    # the alias is part of the key because nested blocks may override it (see `conversion_context()`)
+    memo: typing.Dict[MemoKey, ProtoMsg] = dataclasses.field(default_factory=dict)
+    # objects that are currently being serialized, used to detect reference cycles
+    in_progress: typing.Set[MemoKey] = dataclasses.field(default_factory=set)
+    # same as `memo`, but for `django_to_dict()`
+    dict_memo: typing.Dict[typing.Tuple[MemoKey, bool], dict] = dataclasses.field(
+        default_factory=dict
+    )
+    # use proto field names instead of lowerCamelCase JSON names in `django_to_dict()`
+    preserving_proto_field_name: bool = False
+    # the database alias used by all the queries made during the conversion
+    using: typing.Optional[str] = None
+    # repeated many-to-one relations larger than this are decoded & saved in chunks of this size
+    chunk_size: typing.Optional[int] = None
+    # save objects using a single `INSERT ... ON CONFLICT DO UPDATE` query
+    upsert: bool = False
+    # serialize only the first page of the relations in `ProtoMeta.page_sizes`,
+    # disabled to serialize them in full, e.g. by `djpb_dump`
+    paginate: bool = True
+
+
+_CONTEXT: ContextVar[typing.Optional[ConversionContext]] = ContextVar(
+    "djpb_conversion_context", default=None
+)
+
+
+def get_context() -> typing.Optional[ConversionContext]:
+    return _CONTEXT.get()
+
+
+def get_using() -> typing.Optional[str]:
+    """The database alias of the current conversion, if any."""
+    ctx = _CONTEXT.get()
+    if ctx is None:
+        return None
+    return ctx.using
+
+
+def get_page_sizes(proto_meta) -> typing.Dict[str, int]:
+    """The page sizes of `proto_meta` that apply to the current conversion."""
+    ctx = _CONTEXT.get()
+    if ctx is not None and not ctx.paginate:
+        return {}
+    return proto_meta.page_sizes
+
+
+@contextlib.contextmanager
+def conversion_context(**options) -> typing.Iterator[ConversionContext]:
+    """
+    Share a single `ConversionContext` between all conversions made inside this block.
+
+    Nested blocks join the outer context,
+    unless they override some of its options, in which case the memo is still shared.
+    """
+    ctx = _CONTEXT.get()
+    if ctx is not None and not options:
+        yield ctx
+        return
+
+    if ctx is None:
+        ctx = ConversionContext(**options)
+    else:
+        ctx = dataclasses.replace(ctx, **options)
+
+    token = _CONTEXT.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _CONTEXT.reset(token)
@@ -1,10 +1,22 @@
 import typing
 from dataclasses import dataclass
 
+from django.db.models import QuerySet
+from google.protobuf.json_format import MessageToDict
+
+from .context import get_using
+from .django_to_dict import django_to_dict
 from .django_to_proto import django_to_proto
-from .serializers import SaveNode
+from .serializers import SaveNode, DEFAULT_SERIALIZER
 from .stubs import DjModel, ProtoMsg
-from .util import create_proto_field_obj
+
+
+def _using(qs):
+    # querysets returned by `get_queryset()` that haven't been evaluated yet
+    using = get_using()
+    if using is not None and isinstance(qs, QuerySet) and qs._result_cache is None:
+        qs = qs.using(using)
+    return qs
 
 
 @dataclass
@@ -17,6 +29,16 @@ class CustomField:
     def update_django(self, node: "SaveNode", proto_obj: ProtoMsg, field_name: str):
         pass
 
+    def update_dict(self, django_obj: DjModel, data: dict, key: str, proto_field):
+        # fallback to serializing the field in a scratch message
+        proto_obj = proto_field.containing_type._concrete_class()
+        self.update_proto(django_obj, proto_obj, proto_field.name)
+        value = MessageToDict(proto_obj, preserving_proto_field_name=True)
+        try:
+            data[key] = value[proto_field.name]
+        except KeyError:
+            pass
+
 
 @dataclass
 class ReadOnlyQueryStrField(CustomField):
@@ -25,7 +47,8 @@ class ReadOnlyQueryStrField(CustomField):
     def update_proto(self, django_obj, proto_obj, field_name):
         model = type(django_obj)
         value = (
-            model.objects.filter(pk=django_obj.pk)
+            model.objects.using(get_using())
+            .filter(pk=django_obj.pk)
             .values_list(self.query or field_name, flat=True)
             .first()
         )
@@ -33,6 +56,18 @@ class ReadOnlyQueryStrField(CustomField):
             return
         setattr(proto_obj, field_name, value)
 
+    def update_dict(self, django_obj, data, key, proto_field):
+        model = type(django_obj)
+        value = (
+            model.objects.using(get_using())
+            .filter(pk=django_obj.pk)
+            .values_list(self.query or proto_field.name, flat=True)
+            .first()
+        )
+        if value is None:
+            return
+        DEFAULT_SERIALIZER.update_dict(data, key, proto_field, value)
+
 
 @dataclass
 class ReadOnlyQuerySetField(CustomField):
@@ -40,11 +75,17 @@ class ReadOnlyQuerySetField(CustomField):
 
     def update_proto(self, django_obj, proto_obj, field_name):
         field = getattr(proto_obj, field_name)
-        msgs = [
-            django_to_proto(obj, create_proto_field_obj(proto_obj, field_name))
-            for obj in self.get_queryset(django_obj)
+        for obj in _using(self.get_queryset(django_obj)):
+            django_to_proto(obj, field.add())
+
+    def update_dict(self, django_obj, data, key, proto_field):
+        proto_cls = proto_field.message_type._concrete_class
+        dicts = [
+            django_to_dict(obj, proto_cls)
+            for obj in _using(self.get_queryset(django_obj))
         ]
-        field.extend(msgs)
+        if dicts:
+            data[key] = dicts
 
 
 @dataclass
@@ -56,3 +97,9 @@ class ReadOnlyValueField(CustomField):
         if value is None:
             return
         setattr(proto_obj, field_name, value)
+
+    def update_dict(self, django_obj, data, key, proto_field):
+        value = self.get_value(django_obj)
+        if value is None:
+            return
+        DEFAULT_SERIALIZER.update_dict(data, key, proto_field, value)
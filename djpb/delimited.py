@@ -0,0 +1,108 @@
+import typing
+
+from .stubs import ProtoMsg
+
+#
+# Length-delimited protobuf streams:
+# each message is prefixed by its size, encoded as a varint.
+# This is the same framing as `writeDelimitedTo()` / `parseDelimitedFrom()` in the Java & C++ libraries.
+#
+
+
+def encode_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        bits = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(bits | 0x80)
+        else:
+            out.append(bits)
+            return bytes(out)
+
+
+def decode_varint(buf, pos: int) -> typing.Tuple[int, int]:
+    """
+    Decode a varint from `buf` starting at `pos`.
+    Returns the value and the position right after it.
+    Raises `IndexError` if `buf` ends in the middle of the varint.
+    """
+    result = 0
+    shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+        if shift >= 64:
+            raise ValueError("Malformed varint in length-delimited protobuf stream.")
+
+
+def write_delimited(f: typing.BinaryIO, proto_obj: ProtoMsg):
+    proto_bytes = proto_obj.SerializeToString()
+    f.write(encode_varint(len(proto_bytes)))
+    f.write(proto_bytes)
+
+
+def iter_delimited(buf) -> typing.Iterator[memoryview]:
+    """
+    Iterate over the messages of a length-delimited buffer (e.g. `bytes`, or an `mmap`),
+    yielding zero-copy `memoryview` slices of the serialized messages.
+    """
+    with memoryview(buf) as view:
+        pos = 0
+        end = len(view)
+        while pos < end:
+            try:
+                size, pos = decode_varint(view, pos)
+            except IndexError:
+                raise ValueError("Truncated length-delimited protobuf stream.")
+            if pos + size > end:
+                raise ValueError("Truncated length-delimited protobuf stream.")
+            yield view[pos : pos + size]
+            pos += size
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def iter_delimited_stream(
+    f: typing.BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> typing.Iterator[memoryview]:
+    """
+    Iterate over the messages of a length-delimited stream, reading it `chunk_size` bytes at a time.
+
+    Yields zero-copy `memoryview` slices of the read buffer,
+    which are only valid until the next message is requested, so parse them right away.
+    Memory usage is bounded by `chunk_size` (or the largest message), not the size of the stream.
+    """
+    buf = bytearray()
+    eof = False
+    while True:
+        pos = 0
+        with memoryview(buf) as view:
+            end = len(view)
+            while pos < end:
+                try:
+                    size, start = decode_varint(view, pos)
+                except IndexError:
+                    break
+                if start + size > end:
+                    break
+                with view[start : start + size] as frame:
+                    yield frame
+                pos = start + size
+        # drop the messages that were consumed
+        del buf[:pos]
+
+        if eof:
+            if buf:
+                raise ValueError("Truncated length-delimited protobuf stream.")
+            return
+        data = f.read(chunk_size)
+        if data:
+            buf += data
+        else:
+            eof = True
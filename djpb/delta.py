@@ -0,0 +1,188 @@
+import typing
+
+from google.protobuf.descriptor import Descriptor
+from google.protobuf.field_mask_pb2 import FieldMask
+
+from .django_to_proto import django_to_proto
+from .pagination import PAGE_TOKEN_SUFFIX
+from .registry import PROTO_CLS_TO_MODEL, get_proto_cls
+from .stubs import DjModel, ProtoMsg, ProtoMsgType
+from .util import MaskTree, field_has_presence, field_is_repeated, field_mask_to_tree
+
+
+def django_to_proto_delta(
+    django_obj: DjModel,
+    base: typing.Union[ProtoMsg, bytes],
+    proto_cls: ProtoMsgType = None,
+    *,
+    using: str = None,
+) -> typing.Tuple[ProtoMsg, FieldMask]:
+    """
+    Serialize only the fields of `django_obj` that changed since `base`,
+    an earlier message (or its serialized bytes) of the same object.
+
+    Returns the delta message and a `FieldMask` of the changed fields,
+    which can be applied using `proto_to_django(delta, field_mask=mask)`.
+    Nested & repeated related objects are matched by pk, and diffed recursively.
+    Their pks are always included in the delta, so they can be looked up when applying it.
+
+    As an extension to the `FieldMask` spec, paths can go through repeated relations,
+    e.g. `items.qty` means that the `qty` of some of the `items` changed;
+    every item is then sent with its pk & `qty`.
+    `items.id` alone means that only the membership of the relation changed.
+    """
+    if isinstance(base, (bytes, bytearray, memoryview)):
+        if proto_cls is None:
+            proto_cls = get_proto_cls(type(django_obj))
+        base = proto_cls.FromString(base)
+    current = django_to_proto(django_obj, type(base)(), using=using)
+
+    delta = type(base)()
+    paths = _diff(current, base, delta)
+    _copy_pk(current, delta)
+    return delta, FieldMask(paths=paths)
+
+
+def _diff(current: ProtoMsg, base: ProtoMsg, delta: ProtoMsg) -> typing.List[str]:
+    """Copy the fields of `current` that differ from `base` to `delta`, returning their paths."""
+    paths = []
+
+    for proto_field in current.DESCRIPTOR.fields:
+        field_name = proto_field.name
+        value = getattr(current, field_name)
+        base_value = getattr(base, field_name)
+
+        if field_name.endswith(PAGE_TOKEN_SUFFIX):
+            # always sent, so a truncated relation isn't cleaned up when the delta is applied
+            _copy_field(current, delta, field_name)
+            continue
+
+        if field_is_repeated(proto_field):
+            if _get_pk_name(proto_field.message_type):
+                delta_values = getattr(delta, field_name)
+                sub_paths = _diff_repeated(
+                    proto_field.message_type, value, base_value, delta_values
+                )
+                if sub_paths is None:
+                    paths.append(field_name)
+                else:
+                    paths += [f"{field_name}.{p}" for p in sub_paths]
+            elif list(value) != list(base_value):
+                getattr(delta, field_name).extend(value)
+                paths.append(field_name)
+            continue
+
+        if field_has_presence(proto_field):
+            has_value = current.HasField(field_name)
+            if has_value != base.HasField(field_name):
+                # set, or cleared (an unset field in the mask)
+                if has_value:
+                    _copy_field(current, delta, field_name)
+                paths.append(field_name)
+                continue
+            if not has_value:
+                continue
+
+        if proto_field.message_type is not None:
+            pk_name = _get_pk_name(proto_field.message_type)
+            if pk_name and getattr(value, pk_name) == getattr(base_value, pk_name):
+                # same related object, recurse
+                sub_delta = getattr(delta, field_name)
+                sub_paths = _diff(value, base_value, sub_delta)
+                if sub_paths:
+                    _copy_pk(value, sub_delta)
+                    paths += [f"{field_name}.{p}" for p in sub_paths]
+                else:
+                    delta.ClearField(field_name)
+                continue
+
+        if value != base_value:
+            _copy_field(current, delta, field_name)
+            paths.append(field_name)
+
+    return paths
+
+
+def _diff_repeated(
+    descriptor: Descriptor, values, base_values, delta_values
+) -> typing.Optional[typing.List[str]]:
+    """
+    Diff a repeated relation by pk.
+    Returns `None` if the whole field must be sent, i.e. when it contains new objects.
+    """
+    pk_name = _get_pk_name(descriptor)
+    base_by_pk = {getattr(v, pk_name): v for v in base_values}
+
+    sub_paths = set()
+    for value in values:
+        pk = getattr(value, pk_name)
+        try:
+            base_value = base_by_pk[pk]
+        except KeyError:
+            delta_values.extend(values)
+            return None
+        sub_paths.update(_diff(value, base_value, type(value)()))
+
+    if not sub_paths:
+        if [getattr(v, pk_name) for v in values] == list(base_by_pk):
+            return []
+        sub_paths.add(pk_name)
+
+    # send every object, so the ones missing from the relation can be told apart from the removed ones
+    tree = field_mask_to_tree(sub_paths)
+    for value in values:
+        delta_value = delta_values.add()
+        _copy_masked(value, delta_value, tree)
+        _copy_pk(value, delta_value)
+
+    return sorted(sub_paths)
+
+
+def _copy_masked(src: ProtoMsg, dst: ProtoMsg, tree: MaskTree):
+    for field_name, sub_tree in tree.items():
+        if sub_tree is None:
+            _copy_field(src, dst, field_name)
+            continue
+        proto_field = src.DESCRIPTOR.fields_by_name[field_name]
+        if field_is_repeated(proto_field):
+            dst_values = getattr(dst, field_name)
+            for value in getattr(src, field_name):
+                dst_value = dst_values.add()
+                _copy_masked(value, dst_value, sub_tree)
+                _copy_pk(value, dst_value)
+        elif src.HasField(field_name):
+            dst_value = getattr(dst, field_name)
+            _copy_masked(getattr(src, field_name), dst_value, sub_tree)
+            _copy_pk(getattr(src, field_name), dst_value)
+
+
+def _copy_field(src: ProtoMsg, dst: ProtoMsg, field_name: str):
+    proto_field = src.DESCRIPTOR.fields_by_name[field_name]
+    value = getattr(src, field_name)
+    if field_is_repeated(proto_field):
+        getattr(dst, field_name).extend(value)
+    elif proto_field.message_type is not None:
+        if src.HasField(field_name):
+            getattr(dst, field_name).CopyFrom(value)
+    elif not field_has_presence(proto_field) or src.HasField(field_name):
+        setattr(dst, field_name, value)
+
+
+def _copy_pk(src: ProtoMsg, dst: ProtoMsg):
+    pk_name = _get_pk_name(src.DESCRIPTOR)
+    if pk_name:
+        setattr(dst, pk_name, getattr(src, pk_name))
+
+
+def _get_pk_name(descriptor: typing.Optional[Descriptor]) -> typing.Optional[str]:
+    # the pk field of messages that represent django models
+    if descriptor is None:
+        return None
+    try:
+        django_model = PROTO_CLS_TO_MODEL[descriptor._concrete_class]
+    except KeyError:
+        return None
+    pk_name = django_model._meta.pk.name
+    if pk_name not in descriptor.fields_by_name:
+        return None
+    return pk_name
@@ -0,0 +1,191 @@
+import copy
+import typing
+
+from django.core.exceptions import ObjectDoesNotExist
+
+from djpb.context import (
+    ConversionContext,
+    conversion_context,
+    get_context,
+    get_page_sizes,
+)
+from djpb.pagination import PAGE_TOKEN_SUFFIX
+from djpb.registry import ProtoMeta, get_field_types, get_proto_cls, get_proto_meta
+from djpb.serializers import resolve_serializer
+from djpb.stubs import DjModel, ProtoMsgType
+from djpb.util import (
+    build_django_field_map,
+    resolve_django_field_type,
+    get_django_field_repr,
+    none_value_error,
+    field_has_presence,
+    get_django_value,
+)
+
+
+def django_to_dict(
+    django_obj: DjModel,
+    proto_cls: ProtoMsgType = None,
+    *,
+    preserving_proto_field_name: bool = None,
+    using: str = None,
+) -> dict:
+    """
+    Serialize a django object to the same dict as `MessageToDict(django_to_proto(django_obj))`,
+    without building the intermediate protobuf message.
+    """
+    options = {}
+    if preserving_proto_field_name is not None:
+        options["preserving_proto_field_name"] = preserving_proto_field_name
+    if using is not None:
+        options["using"] = using
+    ctx = get_context()
+    if ctx is None or options:
+        with conversion_context(**options) as ctx:
+            return _django_to_dict(ctx, django_obj, proto_cls)
+    return _django_to_dict(ctx, django_obj, proto_cls)
+
+
+def _django_to_dict(
+    ctx: ConversionContext,
+    django_obj: DjModel,
+    proto_cls: typing.Optional[ProtoMsgType],
+) -> dict:
+    django_model = type(django_obj)
+
+    if proto_cls is None:
+        proto_cls = get_proto_cls(django_model)
+
+    memo_key = None
+    if django_obj.pk is not None:
+        memo_key = (django_model, django_obj.pk, proto_cls, ctx.using)
+        try:
+            cached = ctx.dict_memo[memo_key, ctx.preserving_proto_field_name]
+        except KeyError:
+            pass
+        else:
+            # like `MessageToDict()`, every occurrence is a separate dict that can be mutated
+            return copy.deepcopy(cached)
+        if memo_key in ctx.in_progress:
+            raise ValueError(
+                f"Reference cycle detected while serializing "
+                f"{django_model.__qualname__!r} (pk={django_obj.pk!r}) "
+                f"as {proto_cls.__qualname__!r}."
+            )
+        ctx.in_progress.add(memo_key)
+
+    try:
+        data = _to_dict(
+            django_obj,
+            proto_cls,
+            get_proto_meta(proto_cls),
+            ctx.preserving_proto_field_name,
+            ctx.using,
+        )
+    finally:
+        if memo_key is not None:
+            ctx.in_progress.discard(memo_key)
+
+    if memo_key is not None:
+        ctx.dict_memo[memo_key, ctx.preserving_proto_field_name] = data
+
+    return data
+
+
+def _to_dict(
+    django_obj: DjModel,
+    proto_cls: ProtoMsgType,
+    proto_meta: ProtoMeta,
+    preserving_proto_field_name: bool,
+    using: typing.Optional[str],
+) -> dict:
+    django_model = type(django_obj)
+    field_types = get_field_types(django_model, proto_cls)
+    custom = proto_meta.custom
+    page_sizes = get_page_sizes(proto_meta)
+    data = {}
+
+    for proto_field in proto_cls.DESCRIPTOR.fields:
+        field_name = proto_field.name
+        if preserving_proto_field_name:
+            key = field_name
+        else:
+            key = proto_field.json_name
+
+        # handle custom fields
+        try:
+            field = custom[field_name]
+            field_update_dict = field.update_dict
+        except (KeyError, AttributeError):
+            pass
+        else:
+            field_update_dict(django_obj, data, key, proto_field)
+            continue
+
+        # handle set_null, and page tokens (set with their relation)
+        if field_name.endswith(("__set_null", PAGE_TOKEN_SUFFIX)):
+            continue
+
+        try:
+            django_field_type = field_types[field_name]
+        except KeyError:
+            # raises a descriptive error
+            django_field_type = resolve_django_field_type(
+                django_model, build_django_field_map(django_model), field_name
+            )
+        can_unset = field_has_presence(proto_field)
+
+        try:
+            value = get_django_value(django_obj, field_name, using)
+        except ObjectDoesNotExist:
+            if can_unset:
+                # leave this field "unset"
+                continue
+            raise
+
+        if value is None:
+            if can_unset:
+                # leave this field "unset"
+                continue
+
+            raise none_value_error(django_field_type, django_model, field_name)
+
+        serializer = resolve_serializer(django_field_type)
+
+        try:
+            # repeated oneof support
+            if (
+                proto_field.message_type is not None
+                and proto_field.message_type.name.endswith("__oneof")
+            ):
+                value_field = proto_field.message_type.fields_by_name["value"]
+                if preserving_proto_field_name:
+                    value_key = value_field.name
+                else:
+                    value_key = value_field.json_name
+                data[key] = wrapper = {}
+                serializer.update_dict(wrapper, value_key, value_field, value)
+            elif field_name in page_sizes:
+                token = serializer.update_dict_page(
+                    data, key, proto_field, value, page_sizes[field_name]
+                )
+                if token:
+                    token_field = proto_cls.DESCRIPTOR.fields_by_name[
+                        f"{field_name}{PAGE_TOKEN_SUFFIX}"
+                    ]
+                    if preserving_proto_field_name:
+                        data[token_field.name] = token
+                    else:
+                        data[token_field.json_name] = token
+            else:
+                serializer.update_dict(data, key, proto_field, value)
+        except Exception as e:
+            django_field_repr = get_django_field_repr(
+                django_field_type, django_model, field_name
+            )
+            serializer_repr = repr(serializer.__class__.__qualname__)
+            raise ValueError(
+                f"Failed to serialize {django_field_repr} using {serializer_repr}."
+            ) from e
+
+    return data
@@ -1,50 +1,353 @@
-import inspect
+import typing
 
 from django.core.exceptions import ObjectDoesNotExist
 
-from djpb.registry import MODEL_TO_PROTO_CLS, PROTO_META, ProtoMeta
-from djpb.serializers import SERIALIZERS, DEFAULT_SERIALIZER
-from djpb.signals import pre_django_to_proto, post_django_to_proto
-from djpb.stubs import DjModel, ProtoMsg
+from djpb.compiled import CompiledConverter, get_compiled_converter
+from djpb.context import (
+    ConversionContext,
+    conversion_context,
+    get_context,
+    get_page_sizes,
+)
+from djpb.pagination import PAGE_TOKEN_SUFFIX, get_page
+from djpb.registry import ProtoMeta, get_field_types, get_proto_cls, get_proto_meta
+from djpb.backend import USE_KWARGS_CONSTRUCTOR
+from djpb.serializers import (
+    SERIALIZERS,
+    DEFAULT_SERIALIZER,
+    FieldSerializer,
+    resolve_serializer,
+)
+from djpb.signals import (
+    pre_django_to_proto,
+    post_django_to_proto,
+    post_django_to_proto_many,
+    send_many,
+)
+from djpb.stubs import DjModel, DjModelType, ProtoMsg, ProtoMsgType
 from djpb.util import (
     build_django_field_map,
     resolve_django_field_type,
     get_django_field_repr,
+    none_value_error,
+    field_is_repeated,
+    get_django_value,
 )
 
 
-def django_to_proto_bytes(django_obj: DjModel, proto_obj: ProtoMsg = None) -> bytes:
-    proto_obj = django_to_proto(django_obj, proto_obj)
+def django_to_proto_bytes(
+    django_obj: DjModel, proto_obj: ProtoMsg = None, *, using: str = None
+) -> bytes:
+    proto_obj = django_to_proto(django_obj, proto_obj, using=using)
     proto_bytes = proto_obj.SerializeToString()
     return proto_bytes
 
 
+def django_to_proto_many(
+    django_objs: typing.Iterable[DjModel],
+    proto_cls: ProtoMsgType = None,
+    *,
+    using: str = None,
+) -> typing.List[ProtoMsg]:
+    """
+    Bulk version of `django_to_proto()`.
+
+    Related objects shared between `django_objs` are serialized only once.
+    """
+    with _conversion_context(using) as ctx:
+        django_objs = list(django_objs)
+        proto_objs = [
+            _django_to_proto(ctx, django_obj, None, None, proto_cls)
+            for django_obj in django_objs
+        ]
+    if post_django_to_proto_many.receivers:
+        send_many(post_django_to_proto_many, zip(django_objs, proto_objs))
+    return proto_objs
+
+
+def django_to_proto_page(
+    django_obj: DjModel,
+    field_name: str,
+    token: str = "",
+    proto_cls: ProtoMsgType = None,
+    *,
+    page_size: int = None,
+    using: str = None,
+) -> typing.Tuple[typing.List[ProtoMsg], str]:
+    """
+    Serialize a page of the repeated relation `field_name` of `django_obj`,
+    starting after `token`, i.e. the `<field_name>__next` field of a message
+    (see `ProtoMeta.page_sizes`), or of the previous page.
+
+    `proto_cls` is the protobuf class of `django_obj`, whose field types & page sizes are used.
+    Returns the related messages, and the token of the next page, or `""` on the last one.
+    """
+    if proto_cls is None:
+        proto_cls = get_proto_cls(type(django_obj))
+    try:
+        proto_field = proto_cls.DESCRIPTOR.fields_by_name[field_name]
+    except KeyError:
+        raise ValueError(
+            f"{proto_cls.__qualname__!r} has no field named {field_name!r}."
+        )
+    if page_size is None:
+        try:
+            page_size = get_proto_meta(proto_cls).page_sizes[field_name]
+        except KeyError:
+            raise ValueError(
+                f"Please specify the page size of {field_name!r}, "
+                f"or add it to the `ProtoMeta.page_sizes` of {proto_cls.__qualname__!r}."
+            )
+
+    objs, next_token = get_page(
+        getattr(django_obj, field_name), page_size, token, using
+    )
+    related_cls = proto_field.message_type._concrete_class
+    return django_to_proto_many(objs, related_cls, using=using), next_token
+
+
 def django_to_proto(
-    django_obj: DjModel, proto_obj: ProtoMsg = None, *, proto_meta: ProtoMeta = None
+    django_obj: DjModel,
+    proto_obj: ProtoMsg = None,
+    *,
+    proto_meta: ProtoMeta = None,
+    using: str = None,
 ) -> ProtoMsg:
+    """
+    Serialize a django object (and its related objects) to a protobuf message.
+
+    `using` selects the database alias for every query made during the conversion,
+    including the ones made by nested conversions.
+    """
+    ctx = get_context()
+    if ctx is None or using is not None:
+        with _conversion_context(using) as ctx:
+            return _django_to_proto(ctx, django_obj, proto_obj, proto_meta)
+    return _django_to_proto(ctx, django_obj, proto_obj, proto_meta)
+
+
+def _conversion_context(using: typing.Optional[str]):
+    if using is None:
+        return conversion_context()
+    return conversion_context(using=using)
+
+
+def _django_to_proto_repeated(
+    container, django_objs: typing.Iterable[DjModel], proto_cls: ProtoMsgType
+):
+    """
+    Append the messages of `django_objs` to the repeated field `container`.
+    Each element is built in place by `container.add()`, using keyword arguments where possible.
+    """
+    ctx = get_context()
+    if ctx is None:
+        with _conversion_context(None) as ctx:
+            for django_obj in django_objs:
+                _django_to_proto(ctx, django_obj, None, None, proto_cls, container)
+        return
+    for django_obj in django_objs:
+        _django_to_proto(ctx, django_obj, None, None, proto_cls, container)
+
+
+def _django_to_proto(
+    ctx: ConversionContext,
+    django_obj: DjModel,
+    proto_obj: typing.Optional[ProtoMsg],
+    proto_meta: typing.Optional[ProtoMeta],
+    proto_cls: ProtoMsgType = None,
+    container=None,
+) -> ProtoMsg:
+    """`container` is a repeated field that the new message is added to, instead of creating one."""
     django_model = type(django_obj)
 
-    if proto_obj is None:
+    if proto_obj is not None:
+        proto_cls = type(proto_obj)
+    elif proto_cls is None:
+        proto_cls = get_proto_cls(django_model)
+    if container is None:
+        new_proto = proto_cls
+    else:
+        new_proto = container.add
+
+    # the same related object is often reachable many times from a single root,
+    # so serialize it only once per conversion, and copy the result everywhere else
+    memo_key = None
+    if proto_meta is None and django_obj.pk is not None:
+        memo_key = (django_model, django_obj.pk, proto_cls, ctx.using)
         try:
-            proto_cls = MODEL_TO_PROTO_CLS[django_model][0]
-        except IndexError:
+            cached = ctx.memo[memo_key]
+        except KeyError:
+            pass
+        else:
+            if proto_obj is None:
+                proto_obj = new_proto()
+            # receivers still see every occurrence of the object
+            if pre_django_to_proto.receivers:
+                pre_django_to_proto.send(
+                    django_model, proto_obj=proto_obj, django_obj=django_obj
+                )
+            proto_obj.CopyFrom(cached)
+            if post_django_to_proto.receivers:
+                post_django_to_proto.send(
+                    django_model, proto_obj=proto_obj, django_obj=django_obj
+                )
+            return proto_obj
+        if memo_key in ctx.in_progress:
             raise ValueError(
-                f"Please specify at least one protobuf class for the model {django_model.__qualname__!r}."
+                f"Reference cycle detected while serializing "
+                f"{django_model.__qualname__!r} (pk={django_obj.pk!r}) "
+                f"as {proto_cls.__qualname__!r}."
             )
-        proto_obj = proto_cls()
+        ctx.in_progress.add(memo_key)
+
+    try:
+        if proto_meta is None:
+            proto_meta = get_proto_meta(proto_cls)
+            # generated converters don't route queries to other databases
+            if ctx.using is None:
+                compiled = get_compiled_converter(django_model, proto_cls)
+            else:
+                compiled = None
+        else:
+            compiled = None
+        preset_fields = frozenset()
+        if proto_obj is None:
+            if compiled is None and proto_meta is get_proto_meta(proto_cls):
+                proto_obj, preset_fields = _construct_proto(
+                    django_obj, proto_cls, new_proto
+                )
+            else:
+                proto_obj = new_proto()
+        _update_proto(
+            django_obj, proto_obj, proto_meta, compiled, preset_fields, ctx.using
+        )
+    finally:
+        if memo_key is not None:
+            ctx.in_progress.discard(memo_key)
+
+    if memo_key is not None:
+        ctx.memo[memo_key] = proto_obj
+
+    return proto_obj
+
+
+def _construct_proto(
+    django_obj: DjModel, proto_cls: ProtoMsgType, new_proto: typing.Callable
+) -> typing.Tuple[ProtoMsg, typing.FrozenSet[str]]:
+    """
+    On backends where it's faster, build the message using a single keyword-constructor call
+    (`new_proto` is `proto_cls` or the `add()` of a repeated field), that sets all the plain scalar fields at once.
+    The remaining fields are then filled by the generic loop, which skips the ones already set.
+
+    Singular nested messages are filled in place instead, since constructing them would require a copy.
+    """
+    # pre_django_to_proto receivers expect an empty message
+    if not USE_KWARGS_CONSTRUCTOR or pre_django_to_proto.receivers:
+        return new_proto(), frozenset()
+
+    scalar_fields = _get_scalar_fields(type(django_obj), proto_cls)
+    if not scalar_fields:
+        return new_proto(), frozenset()
+
+    kwargs = {}
+    for field_name in scalar_fields:
+        try:
+            value = getattr(django_obj, field_name)
+        except ObjectDoesNotExist:
+            continue
+        # let the generic loop deal with nulls
+        if value is not None:
+            kwargs[field_name] = value
+    try:
+        return new_proto(**kwargs), frozenset(kwargs)
+    except (TypeError, ValueError):
+        # let the generic loop report the bad value
+        return new_proto(), frozenset()
+
+
+_SCALAR_FIELDS: typing.Dict[
+    typing.Tuple[DjModelType, ProtoMsgType], typing.Tuple[str, ...]
+] = {}
+
+
+def _get_scalar_fields(
+    django_model: DjModelType, proto_cls: ProtoMsgType
+) -> typing.Tuple[str, ...]:
+    # fields that are serialized using a plain setattr(), which the constructor can do instead
+    try:
+        return _SCALAR_FIELDS[django_model, proto_cls]
+    except KeyError:
+        pass
+
+    field_types = get_field_types(django_model, proto_cls)
+    custom = get_proto_meta(proto_cls).custom
+    scalar_fields = []
+    for proto_field in proto_cls.DESCRIPTOR.fields:
+        field_name = proto_field.name
+        if (
+            field_name in custom
+            or field_name.endswith("__set_null")
+            or proto_field.message_type is not None
+            or field_is_repeated(proto_field)
+        ):
+            continue
+        try:
+            django_field_type = field_types[field_name]
+        except KeyError:
+            continue
+        serializer = resolve_serializer(django_field_type)
+        if type(serializer).update_proto is FieldSerializer.update_proto:
+            scalar_fields.append(field_name)
+
+    _SCALAR_FIELDS[django_model, proto_cls] = scalar_fields = tuple(scalar_fields)
+    return scalar_fields
+
+
+def _update_proto(
+    django_obj: DjModel,
+    proto_obj: ProtoMsg,
+    proto_meta: ProtoMeta,
+    compiled: typing.Optional[CompiledConverter],
+    preset_fields: typing.FrozenSet[str],
+    using: typing.Optional[str],
+):
+    django_model = type(django_obj)
+
+    if pre_django_to_proto.receivers:
+        pre_django_to_proto.send(
+            django_model, proto_obj=proto_obj, django_obj=django_obj
+        )
+
+    if compiled is not None:
+        compiled.to_proto(django_obj, proto_obj)
     else:
-        proto_cls = type(proto_obj)
+        _update_proto_fields(django_obj, proto_obj, proto_meta, preset_fields, using)
 
-    field_map = build_django_field_map(django_obj)
+    if post_django_to_proto.receivers:
+        post_django_to_proto.send(
+            django_model, proto_obj=proto_obj, django_obj=django_obj
+        )
 
-    proto_meta = proto_meta or PROTO_META[proto_cls]
-    custom = proto_meta.custom
 
-    pre_django_to_proto.send(django_model, proto_obj=proto_obj, django_obj=django_obj)
+def _update_proto_fields(
+    django_obj: DjModel,
+    proto_obj: ProtoMsg,
+    proto_meta: ProtoMeta,
+    preset_fields: typing.FrozenSet[str],
+    using: typing.Optional[str],
+):
+    django_model = type(django_obj)
+    field_types = get_field_types(django_model, type(proto_obj))
+    custom = proto_meta.custom
+    page_sizes = get_page_sizes(proto_meta)
 
     for proto_field in proto_obj.DESCRIPTOR.fields:
         field_name = proto_field.name
 
+        # already set by the constructor
+        if field_name in preset_fields:
+            continue
+
         # handle custom fields
         try:
             field = custom[field_name]
@@ -55,13 +358,17 @@ def django_to_proto(
             field_update_proto(django_obj, proto_obj, field_name)
             continue
 
-        # handle set_null
-        if field_name.endswith("__set_null"):
+        # handle set_null, and page tokens (set with their relation)
+        if field_name.endswith(("__set_null", PAGE_TOKEN_SUFFIX)):
             continue
 
-        django_field_type = resolve_django_field_type(
-            django_model, field_map, field_name
-        )
+        try:
+            django_field_type = field_types[field_name]
+        except KeyError:
+            # raises a descriptive error
+            django_field_type = resolve_django_field_type(
+                django_model, build_django_field_map(django_model), field_name
+            )
 
         # check if proto field can be in an "unset" state
         try:
@@ -72,7 +379,7 @@ def django_to_proto(
             can_unset = True
 
         try:
-            value = getattr(django_obj, field_name)
+            value = get_django_value(django_obj, field_name, using)
         except ObjectDoesNotExist:
             if can_unset:
                 # leave this field "unset"
@@ -84,24 +391,9 @@ def django_to_proto(
                 # leave this field "unset"
                 continue
 
-            django_field_repr = get_django_field_repr(
-                django_field_type, django_model, field_name
-            )
-            raise ValueError(
-                f"Can't serialize None-type value for {django_field_repr}, "
-                f"because protobuf doesn't support null types.\n"
-                f"You can wrap the field with a `oneof` as a workaround."
-            )
+            raise none_value_error(django_field_type, django_model, field_name)
 
-        # walk down the MRO to resolve the serializer for this field type
-        serializer = DEFAULT_SERIALIZER
-        for base_type in inspect.getmro(django_field_type):
-            try:
-                serializer = SERIALIZERS[base_type]
-            except KeyError:
-                continue
-            else:
-                break
+        serializer = resolve_serializer(django_field_type)
 
         try:
             # repeated oneof support
@@ -110,6 +402,11 @@ def django_to_proto(
                 and proto_field.message_type.name.endswith("__oneof")
             ):
                 serializer.update_proto(getattr(proto_obj, field_name), "value", value)
+            elif field_name in page_sizes:
+                token = serializer.update_proto_page(
+                    proto_obj, field_name, value, page_sizes[field_name]
+                )
+                setattr(proto_obj, f"{field_name}{PAGE_TOKEN_SUFFIX}", token)
             else:
                 serializer.update_proto(proto_obj, field_name, value)
         except Exception as e:
@@ -120,7 +417,3 @@ def django_to_proto(
             raise ValueError(
                 f"Failed to serialize {django_field_repr} using {serializer_repr}."
             ) from e
-
-    post_django_to_proto.send(django_model, proto_obj=proto_obj, django_obj=django_obj)
-
-    return proto_obj
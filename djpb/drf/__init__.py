@@ -1,3 +1,5 @@
-from .parsers import MsgpackParser
-from .renderers import MsgpackRenderer
-from .serializers import ProtobufSerializer
+from .etags import ETagRetrieveMixin
+from .ingest import BulkIngestView
+from .parsers import DelimitedProtobufParser, MsgpackParser
+from .renderers import MsgpackRenderer, ProtobufRenderer
+from .serializers import ConflictError, ProtobufSerializer
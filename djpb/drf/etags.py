@@ -0,0 +1,77 @@
+import hashlib
+import json
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..stubs import DjModel
+
+
+def content_etag(data) -> str:
+    """A strong ETag of the serialized representation (protobuf bytes, or a JSON dict)."""
+    if not isinstance(data, bytes):
+        data = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    return quote_etag(hashlib.blake2b(data, digest_size=16).hexdigest())
+
+
+def version_etag(instance: DjModel, version_field: str, media_type: str = "") -> str:
+    """
+    A weak ETag derived from the object's pk and a field that changes on every save (e.g. `updated_at`).
+    Computing it doesn't require serializing the object.
+    """
+    key = f"{instance._meta.label}:{instance.pk}:{getattr(instance, version_field)}:{media_type}"
+    return "W/" + quote_etag(hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+
+
+def etag_matches(request, etag: str) -> bool:
+    # If-None-Match uses the weak comparison function
+    if_none_match = request.META.get("HTTP_IF_NONE_MATCH")
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    if "*" in etags:
+        return True
+    etag = _strip_weak(etag)
+    return any(_strip_weak(e) == etag for e in etags)
+
+
+def _strip_weak(etag: str) -> str:
+    if etag.startswith("W/"):
+        return etag[2:]
+    return etag
+
+
+class ETagRetrieveMixin:
+    """
+    Adds `ETag` headers to the responses of a retrieve view, and honors `If-None-Match` with 304 responses.
+
+    If the serializer has an `etag_version_field`, the ETag is derived from it,
+    and unchanged objects are never serialized.
+    Otherwise, the ETag is a hash of the deterministic serialization.
+    """
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # the content hash is only stable for deterministic serializations
+        context["deterministic"] = True
+        return context
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+
+        version_field = getattr(self.get_serializer_class(), "etag_version_field", None)
+        if version_field:
+            etag = version_etag(
+                instance, version_field, request.accepted_renderer.media_type
+            )
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+            data = self.get_serializer(instance).data
+        else:
+            data = self.get_serializer(instance).data
+            etag = content_etag(data)
+            if etag_matches(request, etag):
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+        return Response(data, headers={"ETag": etag})
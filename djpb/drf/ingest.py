@@ -0,0 +1,125 @@
+import typing
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.db import IntegrityError
+from google.protobuf.message import DecodeError
+from rest_framework import status
+from rest_framework.fields import get_error_detail
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..concurrency import ConcurrentUpdateError
+from ..proto_to_django import proto_to_django, proto_to_django_many
+from ..signals import post_proto_to_django_many, send_many
+from ..stubs import DjModelType, ProtoMsg, ProtoMsgType
+from .parsers import DelimitedProtobufParser
+from .serializers import ProtobufSerializer
+
+# errors caused by a single bad message, that don't fail the rest of the batch
+# (e.g. an `IntegrityError` for a duplicate that wasn't validated, or was saved concurrently)
+ITEM_ERRORS = (
+    ValidationError,
+    ValueError,
+    ObjectDoesNotExist,
+    ConcurrentUpdateError,
+    IntegrityError,
+)
+
+
+class BulkIngestView(APIView):
+    """
+    Create or update many objects from a length-delimited protobuf request body,
+    that is read & decoded incrementally.
+
+    Messages are saved in batches of `batch_size`, each inside its own transaction,
+    so peak memory depends on the batch size, not on the size of the upload.
+    If a batch fails, its messages are saved one by one, to find the bad ones.
+
+    The response has one entry per message, in `pks` (`null` for failures),
+    and the errors of the failed messages, keyed by their index.
+    A malformed body stops the ingestion, the messages before it are still saved.
+    """
+
+    model: DjModelType = None
+    # a protobuf class, or the name of one of the classes registered for the model
+    proto_cls: typing.Union[ProtoMsgType, str] = None
+    batch_size: int = 500
+    do_full_clean: bool = True
+    upsert: bool = False
+    parser_classes = [DelimitedProtobufParser]
+
+    def get_proto_cls(self) -> ProtoMsgType:
+        serializer_cls = ProtobufSerializer.for_model(self.model, proto_cls=self.proto_cls)
+        return serializer_cls().get_proto_cls()
+
+    def post(self, request, *args, **kwargs):
+        proto_cls = self.get_proto_cls()
+        frames = request.data
+        if not hasattr(frames, "__next__"):
+            # empty body
+            frames = iter(())
+
+        pks = []
+        errors = {}
+        batch = []
+        try:
+            for frame in frames:
+                # parse each frame before the next one is read
+                batch.append(proto_cls.FromString(frame))
+                if len(batch) >= self.batch_size:
+                    self.save_batch(batch, pks, errors)
+                    batch = []
+        except (ValueError, DecodeError) as e:
+            # the messages before the malformed one are still saved
+            detail = f"Malformed message #{len(pks) + len(batch)}: {e}"
+        else:
+            detail = None
+        if batch:
+            self.save_batch(batch, pks, errors)
+
+        data = {"pks": pks, "errors": errors}
+        if detail is not None:
+            data["detail"] = detail
+        if detail is not None or errors:
+            return Response(data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+    def save_batch(
+        self,
+        batch: typing.List[ProtoMsg],
+        pks: typing.List,
+        errors: typing.Dict[int, typing.Any],
+    ):
+        offset = len(pks)
+        try:
+            objs = proto_to_django_many(
+                batch, do_full_clean=self.do_full_clean, upsert=self.upsert
+            )
+        except ITEM_ERRORS:
+            pass
+        else:
+            pks.extend(obj.pk for obj in objs)
+            return
+
+        # each message is saved in its own transaction by `proto_to_django()`
+        pairs = []
+        for i, proto_obj in enumerate(batch):
+            try:
+                obj = proto_to_django(
+                    proto_obj, do_full_clean=self.do_full_clean, upsert=self.upsert
+                )
+            except ITEM_ERRORS as e:
+                pks.append(None)
+                errors[offset + i] = _error_detail(e)
+            else:
+                pks.append(obj.pk)
+                pairs.append((obj, proto_obj))
+        # receivers see the saved messages, like for a batch that didn't fail
+        if pairs and post_proto_to_django_many.receivers:
+            send_many(post_proto_to_django_many, pairs)
+
+
+def _error_detail(e: Exception):
+    if isinstance(e, ValidationError):
+        return get_error_detail(e)
+    return str(e)
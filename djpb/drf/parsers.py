@@ -3,6 +3,8 @@ from msgpack import UnpackException
 from rest_framework.exceptions import ParseError
 from rest_framework.parsers import BaseParser
 
+from ..delimited import DEFAULT_CHUNK_SIZE, iter_delimited_stream
+
 
 class MsgpackParser(BaseParser):
     media_type = "application/msgpack"
@@ -12,3 +14,19 @@ class MsgpackParser(BaseParser):
             return msgpack.load(stream)
         except UnpackException as e:
             raise ParseError(f"MessagePack parse error - {e!r}") from e
+
+
+class DelimitedProtobufParser(BaseParser):
+    """
+    Parses a stream of length-delimited protobuf messages (see `djpb.delimited`),
+    without reading the whole request body.
+
+    The parsed data is an iterator of `memoryview` frames, that must be consumed
+    (e.g. by `BulkIngestView`) while the request is being handled.
+    """
+
+    media_type = "application/x-protobuf-delimited"
+    chunk_size = DEFAULT_CHUNK_SIZE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_delimited_stream(stream, self.chunk_size)
@@ -10,3 +10,22 @@ class MsgpackRenderer(BaseRenderer):
 
     def render(self, data, media_type=None, renderer_context=None):
         return msgpack.packb(data, use_bin_type=True)
+
+
+class ProtobufRenderer(BaseRenderer):
+    """
+    Renders the bytes produced by a `ProtobufSerializer`.
+
+    When a JSON renderer is negotiated instead,
+    the `ProtobufSerializer` produces the equivalent dict directly from the models.
+    """
+
+    media_type = "application/x-protobuf"
+    format = "protobuf"
+    render_style = "binary"
+    charset = None
+
+    def render(self, data, media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return data
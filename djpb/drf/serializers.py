@@ -1,24 +1,41 @@
+import typing
+
 from django.core.exceptions import ValidationError
-from rest_framework import serializers
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
 from rest_framework.fields import get_error_detail
 
+from ..concurrency import ConcurrentUpdateError
+from ..django_to_dict import django_to_dict
 from ..django_to_proto import django_to_proto
 from ..proto_to_django import proto_to_django
-from ..registry import MODEL_TO_PROTO_CLS
+from ..registry import get_proto_cls
 from ..stubs import DjModelType, ProtoMsgType, DjModel, ProtoMsg
 
 
+class ConflictError(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The object was modified by someone else, please reload it and try again."
+    default_code = "conflict"
+
+
 class ProtobufSerializer(serializers.BaseSerializer):
     model: DjModelType
-    proto_cls: ProtoMsgType = None
+    proto_cls: typing.Union[ProtoMsgType, str] = None
     do_full_clean: bool = True
+    # produce the same bytes for the same message, e.g. for stable ETags
+    deterministic: bool = False
+    # a field that changes on every save (e.g. `updated_at`), used to build cheap ETags
+    etag_version_field: str = None
 
     @staticmethod
     def for_model(
         model: DjModelType,
         *,
-        proto_cls: ProtoMsgType = None,
+        proto_cls: typing.Union[ProtoMsgType, str] = None,
         do_full_clean: bool = True,
+        deterministic: bool = False,
+        etag_version_field: str = None,
     ):
         class ProtobufSerializerForModel(ProtobufSerializer):
             pass
@@ -26,6 +43,8 @@ class ProtobufSerializer(serializers.BaseSerializer):
         ProtobufSerializerForModel.model = model
         ProtobufSerializerForModel.proto_cls = proto_cls
         ProtobufSerializerForModel.do_full_clean = do_full_clean
+        ProtobufSerializerForModel.deterministic = deterministic
+        ProtobufSerializerForModel.etag_version_field = etag_version_field
 
         return ProtobufSerializerForModel
 
@@ -47,10 +66,23 @@ class ProtobufSerializer(serializers.BaseSerializer):
             )
         except ValidationError as e:
             raise serializers.ValidationError(get_error_detail(e))
+        except ConcurrentUpdateError as e:
+            raise ConflictError() from e
 
-    def to_representation(self, instance: DjModel) -> bytes:
+    def to_representation(self, instance: DjModel) -> typing.Union[bytes, dict]:
+        if self._wants_json():
+            return django_to_dict(instance, self.get_proto_cls())
         proto_obj = self._to_proto(instance)
-        return proto_obj.SerializeToString()
+        deterministic = self.context.get("deterministic", self.deterministic)
+        return proto_obj.SerializeToString(deterministic=deterministic)
+
+    def _wants_json(self) -> bool:
+        # skip building the protobuf message when a JSON renderer was negotiated
+        try:
+            renderer = self.context["request"].accepted_renderer
+        except (KeyError, AttributeError):
+            return False
+        return "json" in renderer.media_type
 
     def _to_proto(self, instance: DjModel) -> ProtoMsg:
         proto_cls = self.get_proto_cls()
@@ -59,14 +91,10 @@ class ProtobufSerializer(serializers.BaseSerializer):
         return proto_obj
 
     def get_proto_cls(self) -> ProtoMsgType:
-        if self.proto_cls:
-            return self.proto_cls
-        try:
-            return MODEL_TO_PROTO_CLS[self.model][0]
-        except IndexError:
-            raise ValueError(
-                f"Please specify at least one protobuf class for the model {self.model.__qualname__!r}."
-            )
+        # a protobuf class, or the name of one of the classes registered for the model
+        if self.proto_cls is None or isinstance(self.proto_cls, str):
+            return get_proto_cls(self.model, self.proto_cls)
+        return self.proto_cls
 
     #
     # Mostly copy-pasted from the parent class,
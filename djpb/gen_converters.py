@@ -0,0 +1,291 @@
+import hashlib
+import io
+import keyword
+import re
+import typing
+from contextlib import redirect_stdout
+from textwrap import indent
+
+from google.protobuf import descriptor_pb2
+
+from .registry import MODEL_TO_PROTO_CLS, get_proto_meta
+from .serializers import (
+    SERIALIZERS,
+    DEFAULT_SERIALIZER,
+    FieldSerializer,
+    resolve_serializer,
+)
+from .stubs import DjModelType, ProtoMsgType, DjFieldType
+from .util import (
+    build_django_field_map,
+    resolve_django_field_type,
+    field_has_presence,
+)
+
+FIELD_KIND_CUSTOM = "custom"
+FIELD_KIND_SET_NULL = "set_null"
+FIELD_KIND_FIELD = "field"
+
+
+class FieldSpec(typing.NamedTuple):
+    name: str
+    kind: str
+    django_field_type: typing.Optional[DjFieldType] = None
+    # serializer used by `django_to_proto()`, resolved using the MRO
+    to_proto_serializer: typing.Optional[FieldSerializer] = None
+    # serializer used by `proto_to_django()`, resolved using the exact type
+    to_django_serializer: typing.Optional[FieldSerializer] = None
+    can_unset: bool = False
+    is_oneof_wrapper: bool = False
+    is_pk: bool = False
+
+
+def get_field_specs(
+    django_model: DjModelType, proto_cls: ProtoMsgType
+) -> typing.List[FieldSpec]:
+    """
+    Resolve once, what the generic conversion loops decide for every field at runtime.
+    """
+    field_map = build_django_field_map(django_model)
+    custom = get_proto_meta(proto_cls).custom
+
+    specs = []
+    for proto_field in proto_cls.DESCRIPTOR.fields:
+        field_name = proto_field.name
+
+        if field_name in custom:
+            specs.append(
+                FieldSpec(
+                    field_name,
+                    FIELD_KIND_CUSTOM,
+                    can_unset=field_has_presence(proto_field),
+                )
+            )
+            continue
+
+        if field_name.endswith("__set_null"):
+            specs.append(
+                FieldSpec(
+                    field_name,
+                    FIELD_KIND_SET_NULL,
+                    can_unset=field_has_presence(proto_field),
+                )
+            )
+            continue
+
+        django_field_type = resolve_django_field_type(
+            django_model, field_map, field_name
+        )
+        specs.append(
+            FieldSpec(
+                field_name,
+                FIELD_KIND_FIELD,
+                django_field_type=django_field_type,
+                to_proto_serializer=resolve_serializer(django_field_type),
+                to_django_serializer=SERIALIZERS.get(
+                    django_field_type, DEFAULT_SERIALIZER
+                ),
+                can_unset=field_has_presence(proto_field),
+                is_oneof_wrapper=(
+                    proto_field.message_type is not None
+                    and proto_field.message_type.name.endswith("__oneof")
+                ),
+                is_pk=field_name == django_model._meta.pk.name,
+            )
+        )
+
+    return specs
+
+
+def schema_fingerprint(django_model: DjModelType, proto_cls: ProtoMsgType) -> str:
+    """
+    A hash of everything a generated converter depends on,
+    i.e. the protobuf schema, the django field types, and the resolved serializers.
+    """
+    descriptor_proto = descriptor_pb2.DescriptorProto()
+    proto_cls.DESCRIPTOR.CopyToProto(descriptor_proto)
+
+    h = hashlib.sha256()
+    h.update(django_model._meta.label.encode())
+    h.update(descriptor_proto.SerializeToString(deterministic=True))
+    for spec in get_field_specs(django_model, proto_cls):
+        h.update(
+            repr(
+                (
+                    spec.name,
+                    spec.kind,
+                    _qualname(spec.django_field_type),
+                    _qualname(type(spec.to_proto_serializer)),
+                    _qualname(type(spec.to_django_serializer)),
+                    spec.can_unset,
+                    spec.is_oneof_wrapper,
+                    spec.is_pk,
+                )
+            ).encode()
+        )
+    return h.hexdigest()
+
+
+def _qualname(cls) -> str:
+    if cls is None or cls is type(None):
+        return ""
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+def gen_converters_for_models(dj_models: typing.Iterable[DjModelType]) -> str:
+    with io.StringIO() as f, redirect_stdout(f):
+        print("# Generated by `manage.py gen_proto --converters`. DO NOT EDIT!")
+        print("# Set `DJPB_CONVERTERS_MODULE` to the dotted path of this module to use it.")
+        print()
+        print("from django.core.exceptions import ObjectDoesNotExist")
+        print()
+        print("from djpb.compiled import none_error, to_proto_serializer, to_django_serializer")
+        print()
+
+        converters = {}
+        for model in dj_models:
+            for proto_cls in MODEL_TO_PROTO_CLS.get(model, ()):
+                # paginated relations are only supported by the generic conversion loops
+                if get_proto_meta(proto_cls).page_sizes:
+                    continue
+                factory_name = _identifier(
+                    f"make_{model._meta.label}__{proto_cls.DESCRIPTOR.full_name}"
+                )
+                key = (model._meta.label, proto_cls.DESCRIPTOR.full_name)
+                if key in converters:
+                    continue
+                converters[key] = (schema_fingerprint(model, proto_cls), factory_name)
+
+                print()
+                print(_gen_factory(factory_name, get_field_specs(model, proto_cls)))
+                print()
+
+        print()
+        print("CONVERTERS = {")
+        for key, (fingerprint, factory_name) in converters.items():
+            print(f"    {key!r}: ({fingerprint!r}, {factory_name}),")
+        print("}")
+
+        return f.getvalue()
+
+
+def _gen_factory(factory_name: str, specs: typing.List[FieldSpec]) -> str:
+    with io.StringIO() as f, redirect_stdout(f):
+        print(f"def {factory_name}(model, proto_cls, custom):")
+
+        for i, spec in enumerate(specs):
+            if spec.kind == FIELD_KIND_CUSTOM:
+                print(f"    c{i} = custom[{spec.name!r}]")
+            elif spec.kind == FIELD_KIND_FIELD:
+                if not _is_setattr(spec.to_proto_serializer, "update_proto"):
+                    print(f"    sp{i} = to_proto_serializer(model, {spec.name!r})")
+                if not _is_setattr(spec.to_django_serializer, "update_django"):
+                    print(f"    sd{i} = to_django_serializer(model, {spec.name!r})")
+
+        print()
+        print("    def to_proto(django_obj, proto_obj):")
+        body = [_gen_to_proto_field(i, spec) for i, spec in enumerate(specs)]
+        print(indent("\n".join(filter(None, body)) or "pass", " " * 8))
+
+        print()
+        print("    def to_django(node, proto_obj):")
+        print("        django_obj = node.django_obj")
+        body = [_gen_to_django_field(i, spec) for i, spec in enumerate(specs)]
+        print(indent("\n".join(body), " " * 8))
+
+        print()
+        print("    return to_proto, to_django")
+
+        return f.getvalue().rstrip()
+
+
+def _gen_to_proto_field(i: int, spec: FieldSpec) -> str:
+    name = spec.name
+    if spec.kind == FIELD_KIND_CUSTOM:
+        return f"c{i}.update_proto(django_obj, proto_obj, {name!r})"
+    if spec.kind == FIELD_KIND_SET_NULL:
+        return ""
+
+    lines = []
+    if spec.can_unset:
+        lines += [
+            "try:",
+            f"    value = {_getattr('django_obj', name)}",
+            "except ObjectDoesNotExist:",
+            "    value = None",
+            "if value is not None:",
+        ]
+    else:
+        lines += [
+            f"value = {_getattr('django_obj', name)}",
+            "if value is None:",
+            f"    none_error(model, {name!r})",
+            "else:",
+        ]
+
+    if spec.is_oneof_wrapper:
+        target, target_name = _getattr("proto_obj", name), "value"
+    else:
+        target, target_name = "proto_obj", name
+    if _is_setattr(spec.to_proto_serializer, "update_proto"):
+        lines.append(f"    {_setattr(target, target_name, 'value')}")
+    else:
+        lines.append(f"    sp{i}.update_proto({target}, {target_name!r}, value)")
+
+    return "\n".join(lines)
+
+
+def _gen_to_django_field(i: int, spec: FieldSpec) -> str:
+    name = spec.name
+
+    if spec.kind == FIELD_KIND_CUSTOM:
+        lines = [f"c{i}.update_django(node, proto_obj, {name!r})"]
+
+    elif spec.kind == FIELD_KIND_SET_NULL:
+        field_name = name[: -len("__set_null")]
+        lines = [
+            _setattr("django_obj", field_name, "None"),
+            f"node.fields.add({field_name!r})",
+        ]
+
+    else:
+        value = _getattr("proto_obj", name)
+        if spec.is_oneof_wrapper:
+            value += ".value"
+        if _is_setattr(spec.to_django_serializer, "update_django"):
+            lines = [_setattr("django_obj", name, value)]
+        else:
+            lines = [f"sd{i}.update_django(node, {name!r}, {value})"]
+        lines.append(f"node.fields.add({name!r})")
+        if spec.is_pk:
+            # pk might be 0, let's not save that
+            lines = [f"if {value}:"] + [indent(line, " " * 4) for line in lines]
+
+    if spec.can_unset:
+        # leave "unset" fields as-is
+        lines = [f"if proto_obj.HasField({name!r}):"] + [
+            indent(line, " " * 4) for line in lines
+        ]
+
+    return "\n".join(lines)
+
+
+def _is_setattr(serializer: FieldSerializer, method: str) -> bool:
+    # serializers that don't override the default setattr() behaviour can be inlined
+    return getattr(type(serializer), method) is getattr(FieldSerializer, method)
+
+
+def _getattr(obj: str, name: str) -> str:
+    if name.isidentifier() and not keyword.iskeyword(name):
+        return f"{obj}.{name}"
+    return f"getattr({obj}, {name!r})"
+
+
+def _setattr(obj: str, name: str, value: str) -> str:
+    if name.isidentifier() and not keyword.iskeyword(name):
+        return f"{obj}.{name} = {value}"
+    return f"setattr({obj}, {name!r}, {value})"
+
+
+def _identifier(name: str) -> str:
+    return re.sub(r"\W", "_", name)
@@ -12,7 +12,8 @@ from django.db.models.fields.related_descriptors import (
     ForeignKeyDeferredAttribute,
 )
 
-from .registry import PROTO_META
+from .pagination import PAGE_TOKEN_SUFFIX
+from .registry import MODEL_TO_PROTO_CLS, ProtoMeta, get_proto_meta
 from .stubs import DjField, DjFieldType, DjModelType
 from .util import get_django_field_repr, build_django_field_map, disjoint
 
@@ -123,7 +124,7 @@ def _gen_proto_for_model(model: DjModelType, proto_models: ProtoModels):
         return
     proto_models[model] = {}
 
-    proto_meta = PROTO_META[model]
+    proto_meta = _get_proto_meta(model)
 
     field_map = build_django_field_map(model)
 
@@ -138,15 +139,28 @@ def _gen_proto_for_model(model: DjModelType, proto_models: ProtoModels):
         {name: (field, field.proto_type) for name, field in custom.items()}
     )
 
+    # add the continuation tokens of paginated relations
+    for name in proto_meta.page_sizes:
+        proto_fields[f"{name}{PAGE_TOKEN_SUFFIX}"] = (None, "string")
+
     proto_models[model] = proto_fields
 
 
+def _get_proto_meta(model: DjModelType) -> ProtoMeta:
+    # models that don't have a protobuf class yet use the defaults
+    try:
+        proto_cls = MODEL_TO_PROTO_CLS[model][0]
+    except (KeyError, IndexError):
+        return ProtoMeta()
+    return get_proto_meta(proto_cls)
+
+
 def _resolve_proto_type(
     field_name: str, field, model: DjModelType, proto_models: ProtoModels
 ) -> typing.Tuple[DjField, str]:
     field_type = type(field)
 
-    proto_meta = PROTO_META[model]
+    proto_meta = _get_proto_meta(model)
 
     if field_name in proto_meta.enums:
         enum_cls = proto_meta.enums[field_name]
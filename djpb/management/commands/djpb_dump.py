@@ -0,0 +1,83 @@
+import itertools
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from djpb.context import conversion_context
+from djpb.delimited import write_delimited
+from djpb.django_to_proto import django_to_proto_many
+from djpb.registry import MODEL_TO_PROTO_CLS, get_proto_cls
+
+
+class Command(BaseCommand):
+    help = (
+        "Dump registered models to length-delimited protobuf files, "
+        "one `<app_label>.<ModelName>.pb` file per model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            metavar="app_label.ModelName",
+            help="Models to dump. Defaults to all registered models.",
+        )
+        parser.add_argument(
+            "-o", "--output", default=".", help="Directory to write the files to."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of rows fetched from the database at a time.",
+        )
+        parser.add_argument(
+            "--database",
+            help="The database to dump from. Defaults to the one chosen by the database routers.",
+        )
+
+    def handle(self, *args, **options):
+        if options["models"]:
+            try:
+                models = [apps.get_model(label) for label in options["models"]]
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e)) from e
+        else:
+            models = list(MODEL_TO_PROTO_CLS.keys())
+
+        os.makedirs(options["output"], exist_ok=True)
+
+        for model in models:
+            try:
+                proto_cls = get_proto_cls(model)
+            except ValueError:
+                raise CommandError(
+                    f"No protobuf class is registered for the model {model._meta.label!r}."
+                )
+
+            path = os.path.join(options["output"], f"{model._meta.label}.pb")
+            count = self.dump_model(
+                model, proto_cls, path, options["chunk_size"], options["database"]
+            )
+            self.stdout.write(f"Dumped {count} {model._meta.label} object(s) to {path}")
+
+    def dump_model(self, model, proto_cls, path, chunk_size, database) -> int:
+        qs = (
+            model._default_manager.using(database)
+            .order_by("pk")
+            .iterator(chunk_size=chunk_size)
+        )
+        count = 0
+        with open(path, "wb") as f:
+            while True:
+                chunk = list(itertools.islice(qs, chunk_size))
+                if not chunk:
+                    break
+                # dump the relations in `ProtoMeta.page_sizes` in full, not just a page
+                with conversion_context(paginate=False):
+                    proto_objs = django_to_proto_many(chunk, proto_cls, using=database)
+                for proto_obj in proto_objs:
+                    write_delimited(f, proto_obj)
+                count += len(chunk)
+        return count
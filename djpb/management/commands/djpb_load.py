@@ -0,0 +1,95 @@
+import itertools
+import mmap
+import os
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+
+from djpb.delimited import iter_delimited
+from djpb.proto_to_django import proto_to_django_many
+from djpb.registry import get_proto_cls
+
+
+class Command(BaseCommand):
+    help = (
+        "Load length-delimited protobuf files created by `djpb_dump`. "
+        "Each batch of messages is saved inside its own transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+", help="Files to load, in order.")
+        parser.add_argument(
+            "--model",
+            metavar="app_label.ModelName",
+            help="Model to load the files into. "
+            "Defaults to the model named by each file (`<app_label>.<ModelName>.pb`).",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of messages saved per transaction.",
+        )
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Save objects with `INSERT ... ON CONFLICT DO UPDATE` queries (the default), "
+            "so dumps can be restored into an empty database, "
+            "where the related objects that messages embed by pk don't exist yet.",
+        )
+        parser.add_argument(
+            "--no-upsert",
+            action="store_false",
+            dest="upsert",
+            help="Save objects with plain `INSERT` / `UPDATE` queries. "
+            "Related objects embedded by pk must already exist.",
+        )
+        parser.set_defaults(upsert=True)
+        parser.add_argument(
+            "--full-clean",
+            action="store_true",
+            help="Call `full_clean()` on each object before saving.",
+        )
+        parser.add_argument(
+            "--database",
+            help="The database to load into. Defaults to the one chosen by the database routers.",
+        )
+
+    def handle(self, *args, **options):
+        for path in options["files"]:
+            label = options["model"] or os.path.basename(path)[: -len(".pb")]
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as e:
+                raise CommandError(f"Can't find the model for {path!r}: {e}") from e
+            try:
+                proto_cls = get_proto_cls(model)
+            except ValueError:
+                raise CommandError(
+                    f"No protobuf class is registered for the model {model._meta.label!r}."
+                )
+
+            count = 0
+            messages = self.read_messages(path, proto_cls)
+            while True:
+                batch = list(itertools.islice(messages, options["batch_size"]))
+                if not batch:
+                    break
+                proto_to_django_many(
+                    batch,
+                    do_full_clean=options["full_clean"],
+                    upsert=options["upsert"],
+                    using=options["database"],
+                )
+                count += len(batch)
+            self.stdout.write(f"Loaded {count} {model._meta.label} object(s) from {path}")
+
+    def read_messages(self, path, proto_cls):
+        with open(path, "rb") as f:
+            if not os.fstat(f.fileno()).st_size:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for frame in iter_delimited(mm):
+                    # release the frame before the file is unmapped
+                    with frame:
+                        yield proto_cls.FromString(frame)
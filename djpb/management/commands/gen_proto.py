@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 
+from djpb.gen_converters import gen_converters_for_models
 from djpb.gen_proto import gen_proto_for_models
 from djpb.registry import MODEL_TO_PROTO_CLS
 
@@ -7,5 +8,17 @@ from djpb.registry import MODEL_TO_PROTO_CLS
 class Command(BaseCommand):
     help = "Generate protobuf file for all registered models."
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--converters",
+            metavar="PATH",
+            help="Also write a python module of specialized converters to PATH. "
+            "Point `settings.DJPB_CONVERTERS_MODULE` to it to use them.",
+        )
+
     def handle(self, *args, **options):
         print(gen_proto_for_models(MODEL_TO_PROTO_CLS.keys()))
+
+        if options["converters"]:
+            with open(options["converters"], "w") as f:
+                f.write(gen_converters_for_models(MODEL_TO_PROTO_CLS.keys()))
@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+import typing
+
+from django.core.exceptions import ValidationError
+
+from .stubs import DjModel
+from .util import get_related_queryset
+
+# suffix of the (optional) string field, that holds the continuation token of a paginated relation
+PAGE_TOKEN_SUFFIX = "__next"
+
+
+def encode_page_token(pk) -> str:
+    data = json.dumps([pk], default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def decode_page_token(token: str, pk_field) -> typing.Any:
+    if not token:
+        return None
+    try:
+        (value,) = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return pk_field.to_python(value)
+    except (binascii.Error, ValidationError, ValueError, TypeError) as e:
+        raise ValueError(f"Invalid page token {token!r}.") from e
+
+
+def get_page(
+    manager, page_size: int, token: str = "", using: str = None
+) -> typing.Tuple[typing.List[DjModel], str]:
+    """
+    Fetch the related objects of `manager` after `token`, ordered by pk,
+    without counting or skipping over the previous ones (keyset pagination).
+
+    Returns the objects, and the token of the next page, or `""` on the last one.
+    """
+    qs = get_related_queryset(manager, using)
+    after = decode_page_token(token, qs.model._meta.pk)
+
+    if qs._result_cache is not None:
+        # prefetched, paginate in memory
+        objs = sorted(qs, key=lambda obj: obj.pk)
+        if after is not None:
+            objs = [obj for obj in objs if obj.pk > after]
+        objs = objs[: page_size + 1]
+    else:
+        qs = qs.order_by("pk")
+        if after is not None:
+            qs = qs.filter(pk__gt=after)
+        # one more, to know if there's a next page
+        objs = list(qs[: page_size + 1])
+
+    if len(objs) <= page_size:
+        return objs, ""
+    objs = objs[:page_size]
+    return objs, encode_page_token(objs[-1].pk)
@@ -0,0 +1,175 @@
+import typing
+
+from django.db import router
+
+from .concurrency import ConcurrentUpdateError
+from .stubs import DjModel
+from .validation import validate_nodes
+
+# to avoid circular import
+if False:
+    from .serializers import SaveNode
+
+
+def obj_repr(django_obj: DjModel) -> str:
+    return f"{django_obj._meta.label}(pk={django_obj.pk!r})"
+
+
+class SaveStep:
+    def execute(self):
+        raise NotImplementedError()
+
+    def describe(self) -> str:
+        raise NotImplementedError()
+
+
+class SaveObjectStep(SaveStep):
+    def __init__(self, node: "SaveNode", using: typing.Optional[str] = None):
+        self.node = node
+        self.using = using
+
+    def execute(self):
+        if self.node.is_upsert():
+            self._upsert()
+            return
+        if self.node.version_check:
+            self._update_versioned()
+            return
+        self.node.django_obj.save(using=self.using)
+
+    def _update_versioned(self):
+        # claim the expected version using `UPDATE ... SET version = version + 1 WHERE version = <expected>`,
+        # then save normally, inside the same transaction (see `proto_to_django()`)
+        django_obj = self.node.django_obj
+        django_model = type(django_obj)
+        version_field, expected_version = self.node.version_check
+        using = self.using or router.db_for_write(django_model, instance=django_obj)
+
+        claimed = (
+            django_model._base_manager.using(using)
+            .filter(pk=django_obj.pk, **{version_field: expected_version})
+            .update(**{version_field: expected_version + 1})
+        )
+        if not claimed:
+            raise ConcurrentUpdateError(django_obj, version_field, expected_version)
+
+        setattr(django_obj, version_field, expected_version + 1)
+        try:
+            django_obj.save(using=using)
+        except Exception:
+            setattr(django_obj, version_field, expected_version)
+            raise
+
+    def _upsert(self):
+        django_obj = self.node.django_obj
+        django_model = type(django_obj)
+        unique_fields = self.node.upsert_on
+        update_fields = self.get_update_fields()
+
+        manager = django_model._base_manager.db_manager(self.using)
+        if update_fields:
+            manager.bulk_create(
+                [django_obj],
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=update_fields,
+            )
+        else:
+            manager.bulk_create([django_obj], ignore_conflicts=True)
+
+        # some databases don't return the pk for conflicting rows
+        if django_obj.pk is None:
+            django_obj.pk = (
+                manager.filter(**{f: getattr(django_obj, f) for f in unique_fields})
+                .values_list("pk", flat=True)
+                .get()
+            )
+        django_obj._state.adding = False
+
+    def get_update_fields(self) -> typing.List[str]:
+        django_obj = self.node.django_obj
+        update_fields = []
+        for field in django_obj._meta.concrete_fields:
+            if field.primary_key or field.name in self.node.upsert_on:
+                continue
+            if field.name in self.node.fields or getattr(field, "auto_now", False):
+                update_fields.append(field.name)
+        return update_fields
+
+    def describe(self):
+        django_obj = self.node.django_obj
+        if self.node.is_upsert():
+            return (
+                f"UPSERT {obj_repr(django_obj)} "
+                f"ON CONFLICT ({', '.join(self.node.upsert_on)}) "
+                f"UPDATE ({', '.join(self.get_update_fields())})"
+            )
+        if self.node.version_check:
+            version_field, expected_version = self.node.version_check
+            return f"UPDATE {obj_repr(django_obj)} WHERE {version_field} = {expected_version!r}"
+        action = "INSERT" if django_obj._state.adding else "UPDATE"
+        return f"{action} {obj_repr(django_obj)}"
+
+
+class CallStep(SaveStep):
+    def __init__(self, description: str, func: typing.Callable, *args):
+        self.description = description
+        self.func = func
+        self.args = args
+
+    def execute(self):
+        self.func(*self.args)
+
+    def describe(self):
+        return self.description
+
+
+class SavePlan:
+    """
+    A flat, ordered list of steps that saves every object of a `SaveNode` graph exactly once.
+
+    For each node, the related objects it points to (FK targets) are saved first,
+    then the node itself, then its reverse-FK children, and finally its M2M links.
+    """
+
+    def __init__(self, using: str = None):
+        # the database alias that all the objects are saved to
+        self.using = using
+        self.do_full_clean = False
+        self.steps: typing.List[SaveStep] = []
+        # the top-level nodes, and their paths in the input messages (used in error messages)
+        self.roots: typing.List[typing.Tuple[str, "SaveNode"]] = []
+        self._planned: typing.Set[int] = set()
+
+    def add_root(self, node: "SaveNode", path: str = ""):
+        self.roots.append((path, node))
+        self.add_node(node)
+
+    def add_node(self, node: "SaveNode"):
+        if id(node) in self._planned:
+            return
+        self._planned.add(id(node))
+
+        children = sorted(node.children, key=lambda c: c.serializer.save_order)
+        for child in children:
+            if child.serializer.save_order < 0:
+                child.serializer.plan(self, node, child)
+        self.steps.append(SaveObjectStep(node, self.using))
+        for child in children:
+            if child.serializer.save_order >= 0:
+                child.serializer.plan(self, node, child)
+
+    def add_step(self, description: str, func: typing.Callable, *args):
+        self.steps.append(CallStep(description, func, *args))
+
+    def execute(self, do_full_clean: bool):
+        # read by steps that decode objects while executing, see `ChildStream`
+        self.do_full_clean = do_full_clean
+        if do_full_clean:
+            # validate everything upfront, so no objects are saved if any of them are invalid
+            validate_nodes(self.roots, self.using)
+        for step in self.steps:
+            step.execute()
+
+    def describe(self) -> typing.List[str]:
+        return [step.describe() for step in self.steps]
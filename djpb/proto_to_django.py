@@ -1,43 +1,151 @@
+import typing
+
 from django.db import transaction
+from google.protobuf.field_mask_pb2 import FieldMask
 
+from djpb.compiled import get_compiled_converter
+from djpb.context import conversion_context, get_context, get_using
 from djpb.django_to_proto import SERIALIZERS, DEFAULT_SERIALIZER
-from djpb.registry import PROTO_CLS_TO_MODEL, MODEL_TO_PROTO_CLS, PROTO_META
+from djpb.pagination import PAGE_TOKEN_SUFFIX
+from djpb.registry import (
+    PROTO_CLS_TO_MODEL,
+    ProtoMeta,
+    get_field_types,
+    get_proto_meta,
+)
+from djpb.planner import SavePlan
 from djpb.serializers import FieldSerializer, SaveNode
 from djpb.util import (
+    MaskTree,
+    field_mask_to_tree,
     build_django_field_map,
     resolve_django_field_type,
     get_django_field_repr,
 )
-from .signals import post_proto_to_django, pre_proto_to_django
+from .signals import (
+    post_proto_to_django,
+    post_proto_to_django_many,
+    pre_proto_to_django,
+    send_many,
+)
 from .stubs import ProtoMsg, DjModel, DjModelType
 
 
 def proto_to_django(
-    proto_obj: ProtoMsg, django_obj: DjModel = None, *, do_full_clean=False
+    proto_obj: ProtoMsg,
+    django_obj: DjModel = None,
+    *,
+    do_full_clean=False,
+    upsert=False,
+    using: str = None,
+    field_mask: FieldMask = None,
+    chunk_size: int = None,
 ) -> DjModel:
-    node = _proto_to_django(proto_obj, django_obj)
-    with transaction.atomic():
-        node.save(do_full_clean)
+    """
+    Create or update a django object (and its related objects) from a protobuf message.
+
+    With `upsert=True`, objects are not looked up by pk before saving.
+    Instead, each object is written using a single `INSERT ... ON CONFLICT DO UPDATE` query,
+    that only updates the fields present in the message.
+    The conflict target can be configured using `ProtoMeta.unique_fields`.
+
+    `using` selects the database alias for all the lookups and writes.
+
+    Objects with a `ProtoMeta.version_field` are updated only if their version hasn't changed,
+    otherwise `ConcurrentUpdateError` is raised. See `retry_on_conflict()`.
+
+    With a `field_mask`, only the fields in the mask are updated,
+    and the ones that are in the mask but unset in the message are set to null.
+    See `django_to_proto_delta()`.
+
+    With a `chunk_size`, repeated many-to-one relations that are larger than it
+    are decoded, validated & saved in chunks of that size, using bulk queries.
+    """
+    if field_mask is not None:
+        mask = field_mask_to_tree(field_mask.paths)
+    else:
+        mask = None
+    with conversion_context(upsert=upsert, using=using, chunk_size=chunk_size):
+        node = _proto_to_django(proto_obj, django_obj, mask)
+        with transaction.atomic(using=using):
+            node.save(do_full_clean, using)
     django_obj = node.django_obj
     return django_obj
 
 
-def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNode:
-    proto_fields = {x.name: x for x in proto_obj.DESCRIPTOR.fields}
+def proto_to_django_many(
+    proto_objs: typing.Iterable[ProtoMsg],
+    *,
+    do_full_clean=False,
+    upsert=False,
+    using: str = None,
+    chunk_size: int = None,
+) -> typing.List[DjModel]:
+    """
+    Bulk version of `proto_to_django()`.
+
+    All the objects are saved using a single plan, inside a single transaction.
+    With `do_full_clean=True`, all of them are validated before any of them is saved,
+    and the errors are keyed by message index, e.g. `[0].items[2].sku`.
+    """
+    with conversion_context(upsert=upsert, using=using, chunk_size=chunk_size):
+        proto_objs = list(proto_objs)
+        nodes = [_proto_to_django(proto_obj) for proto_obj in proto_objs]
+        plan = SavePlan(using)
+        for i, node in enumerate(nodes):
+            plan.add_root(node, f"[{i}]")
+        with transaction.atomic(using=using):
+            plan.execute(do_full_clean)
+            if post_proto_to_django_many.receivers:
+                pairs = [(node.django_obj, p) for node, p in zip(nodes, proto_objs)]
+                send_many(post_proto_to_django_many, pairs)
+    return [node.django_obj for node in nodes]
+
+
+def plan_proto_to_django(
+    proto_obj: ProtoMsg,
+    django_obj: DjModel = None,
+    *,
+    upsert=False,
+    using: str = None,
+    chunk_size: int = None,
+) -> SavePlan:
+    """
+    Dry-run for `proto_to_django()`.
+
+    Returns the plan of writes that would be made, without making them.
+    Use `SavePlan.describe()` to list the planned statements.
+    """
+    with conversion_context(upsert=upsert, using=using, chunk_size=chunk_size):
+        node = _proto_to_django(proto_obj, django_obj)
+    return node.plan(using)
+
+
+def _proto_to_django(
+    proto_obj: ProtoMsg, django_obj: DjModel = None, mask: MaskTree = None
+) -> SaveNode:
+    proto_fields = proto_obj.DESCRIPTOR.fields_by_name
 
     proto_cls = type(proto_obj)
+    proto_meta = get_proto_meta(proto_cls)
+    ctx = get_context()
+    upsert = ctx is not None and ctx.upsert
+    using = get_using()
+
     if django_obj is None:
         django_cls = PROTO_CLS_TO_MODEL[proto_cls]
 
         # try to get an existing object if it's pk is present in the proto fields
         pk_field_name = django_cls._meta.pk.name
 
-        if pk_field_name in proto_fields:
+        if pk_field_name in proto_fields and not upsert:
             pk = getattr(proto_obj, pk_field_name)
 
             if pk:  # pk might be 0, let's ignore that
                 try:
-                    django_obj = django_cls.objects.get(**{pk_field_name: pk})
+                    django_obj = django_cls.objects.db_manager(using).get(
+                        **{pk_field_name: pk}
+                    )
                 except django_cls.DoesNotExist:
                     pass
 
@@ -45,15 +153,58 @@ def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNod
             django_obj = django_cls()
 
     django_model = django_obj.__class__
-    field_map = build_django_field_map(django_obj)
-    node = SaveNode(django_obj)
+    node = SaveNode(django_obj, mask)
+    if upsert:
+        node.upsert_on = proto_meta.unique_fields or (django_model._meta.pk.name,)
+
+    if pre_proto_to_django.receivers:
+        pre_proto_to_django.send(
+            django_model, proto_obj=proto_obj, django_obj=django_obj
+        )
+
+    # generated converters don't support field masks
+    if mask is None:
+        compiled = get_compiled_converter(django_model, proto_cls)
+    else:
+        compiled = None
+    if compiled is not None:
+        compiled.to_django(node, proto_obj)
+    else:
+        _update_django_fields(node, proto_obj, proto_meta)
+
+    # the version sent by the client, or the one that was just read
+    if proto_meta.version_field and not upsert and not django_obj._state.adding:
+        node.version_check = (
+            proto_meta.version_field,
+            getattr(django_obj, proto_meta.version_field),
+        )
 
-    proto_meta = PROTO_META[proto_cls]
+    if post_proto_to_django.receivers:
+        post_proto_to_django.send(
+            django_model, proto_obj=proto_obj, django_obj=django_obj
+        )
+
+    return node
+
+
+def _update_django_fields(
+    node: SaveNode,
+    proto_obj: ProtoMsg,
+    proto_meta: ProtoMeta,
+):
+    django_obj = node.django_obj
+    django_model = django_obj.__class__
+    field_types = get_field_types(django_model, type(proto_obj))
+    pk_field_name = django_model._meta.pk.name
     custom = proto_meta.custom
+    mask = node.mask
 
-    pre_proto_to_django.send(django_model, proto_obj=proto_obj, django_obj=django_obj)
+    for proto_field in proto_obj.DESCRIPTOR.fields:
+        field_name = proto_field.name
+
+        if mask is not None and field_name not in mask:
+            continue
 
-    for field_name, proto_field in proto_fields.items():
         # determine if field is in "unset" state
         try:
             unset = not proto_obj.HasField(field_name)
@@ -61,6 +212,10 @@ def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNod
             unset = False
 
         if unset:
+            # fields in the mask are cleared
+            if mask is not None and field_name not in custom:
+                setattr(django_obj, field_name, None)
+                node.fields.add(field_name)
             # leave "unset" fields as-is
             continue
 
@@ -74,15 +229,24 @@ def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNod
             field_update_django(node, proto_obj, field_name)
             continue
 
+        # page tokens only matter to their relation
+        if field_name.endswith(PAGE_TOKEN_SUFFIX):
+            continue
+
         # handle set_null
         if field_name.endswith("__set_null"):
             field_name = field_name[: -len("__set_null")]
             setattr(django_obj, field_name, None)
+            node.fields.add(field_name)
             continue
 
-        django_field_type = resolve_django_field_type(
-            django_model, field_map, field_name
-        )
+        try:
+            django_field_type = field_types[field_name]
+        except KeyError:
+            # raises a descriptive error
+            django_field_type = resolve_django_field_type(
+                django_model, build_django_field_map(django_model), field_name
+            )
         value = getattr(proto_obj, field_name)
 
         # repeated oneof support
@@ -92,6 +256,10 @@ def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNod
         ):
             value = value.value
 
+        # pk might be 0, let's not save that
+        if field_name == pk_field_name and not value:
+            continue
+
         serializer: FieldSerializer = SERIALIZERS.get(
             django_field_type, DEFAULT_SERIALIZER
         )
@@ -105,7 +273,10 @@ def _proto_to_django(proto_obj: ProtoMsg, django_obj: DjModel = None) -> SaveNod
             raise ValueError(
                 f"Failed to de-serialize {django_field_repr} using {serializer_repr}."
             ) from e
+        node.fields.add(field_name)
 
-    post_proto_to_django.send(django_model, proto_obj=proto_obj, django_obj=django_obj)
-
-    return node
+        # a truncated relation (see `ProtoMeta.page_sizes`), the objects after the page are kept
+        if field_name in proto_meta.page_sizes and getattr(
+            proto_obj, f"{field_name}{PAGE_TOKEN_SUFFIX}", ""
+        ):
+            node.skip_cleanup(field_name)
@@ -1,15 +1,21 @@
 import typing
-from collections import defaultdict
 
-from .stubs import DjModelType, ProtoMsgType
+from django.core import checks
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+
+from .pagination import PAGE_TOKEN_SUFFIX
+from .stubs import DjModelType, ProtoMsgType, DjFieldType
+from .util import (
+    build_django_field_map,
+    field_is_repeated,
+    resolve_django_field_type,
+)
 
 # to avoid circular import
 if False:
     from .custom_field import CustomField
 
-MODEL_TO_PROTO_CLS: typing.DefaultDict[
-    DjModelType, typing.List[ProtoMsgType]
-] = defaultdict(lambda: [])
+MODEL_TO_PROTO_CLS: typing.Dict[DjModelType, typing.List[ProtoMsgType]] = {}
 
 PROTO_CLS_TO_MODEL: typing.Dict[ProtoMsgType, DjModelType] = {}
 
@@ -19,6 +25,9 @@ class ProtoMeta:
         self,
         custom: typing.Dict[str, "CustomField"] = None,
         enums: typing.Dict[str, typing.Type] = None,
+        unique_fields: typing.Sequence[str] = None,
+        version_field: str = None,
+        page_sizes: typing.Dict[str, int] = None,
     ):
         if custom is None:
             custom = {}
@@ -26,21 +35,262 @@ class ProtoMeta:
             enums = {}
         self.custom = custom
         self.enums = enums
+        # the conflict target for upserts, defaults to the primary key
+        self.unique_fields = unique_fields
+        # an integer field, incremented on every update,
+        # that's used to detect concurrent updates (see `ConcurrentUpdateError`)
+        self.version_field = version_field
+        # repeated relation -> max number of related objects embedded in the message,
+        # the next ones are fetched using `django_to_proto_page()`
+        self.page_sizes = page_sizes or {}
+
 
+PROTO_META: typing.Dict[ProtoMsgType, ProtoMeta] = {}
 
-PROTO_META: typing.DefaultDict[ProtoMsgType, ProtoMeta] = defaultdict(ProtoMeta)
+# used for protobuf classes that weren't registered, don't modify
+DEFAULT_PROTO_META = ProtoMeta()
+
+# set by `freeze_registry()`
+_frozen = False
+# django model -> (protobuf class name -> protobuf class)
+_PROTO_CLS_BY_NAME: typing.Dict[DjModelType, typing.Dict[str, ProtoMsgType]] = {}
+# (django model, protobuf class) -> (protobuf field name -> django field type)
+_FIELD_TYPES: typing.Dict[
+    typing.Tuple[DjModelType, ProtoMsgType], typing.Dict[str, DjFieldType]
+] = {}
 
 
 def register_model(
     proto_classes: typing.List[ProtoMsgType], proto_meta: ProtoMeta = None
 ):
     def decorator(django_model: DjModelType):
-        MODEL_TO_PROTO_CLS[django_model] += proto_classes
+        if _frozen:
+            raise ImproperlyConfigured(
+                f"Can't register the model {django_model._meta.label!r}, "
+                f"because the djpb registry is frozen once the djpb app is ready. "
+                f"Register models in a `models.py`, "
+                f"or in the `ready()` of an app listed before djpb in INSTALLED_APPS."
+            )
+        registered = MODEL_TO_PROTO_CLS.setdefault(django_model, [])
+        registered.extend(cls for cls in proto_classes if cls not in registered)
         for proto_class in proto_classes:
             PROTO_CLS_TO_MODEL[proto_class] = django_model
-            if proto_meta:
+            # registering a class again without a `proto_meta` keeps its current one
+            if proto_meta is not None:
                 PROTO_META[proto_class] = proto_meta
+            else:
+                PROTO_META.setdefault(proto_class, ProtoMeta())
 
         return django_model
 
     return decorator
+
+
+def get_proto_meta(proto_cls: ProtoMsgType) -> ProtoMeta:
+    return PROTO_META.get(proto_cls, DEFAULT_PROTO_META)
+
+
+def get_proto_cls(django_model: DjModelType, name: str = None) -> ProtoMsgType:
+    """
+    The protobuf class registered for `django_model`.
+    Models with more than one class can choose one by its (full) message name,
+    otherwise the first registered class is used.
+    """
+    try:
+        if _frozen:
+            by_name = _PROTO_CLS_BY_NAME[django_model]
+        else:
+            by_name = _get_proto_cls_by_name(django_model)
+        return by_name[name]
+    except KeyError:
+        pass
+    if name is None:
+        raise ValueError(
+            f"Please specify at least one protobuf class for the model {django_model.__qualname__!r}."
+        )
+    raise ValueError(
+        f"No protobuf class named {name!r} is registered for the model {django_model.__qualname__!r}."
+    )
+
+
+def _get_proto_cls_by_name(
+    django_model: DjModelType,
+) -> typing.Dict[typing.Optional[str], ProtoMsgType]:
+    by_name = {}
+    for proto_cls in reversed(MODEL_TO_PROTO_CLS[django_model]):
+        by_name[proto_cls.DESCRIPTOR.name] = proto_cls
+        by_name[proto_cls.DESCRIPTOR.full_name] = proto_cls
+        by_name[None] = proto_cls
+    return by_name
+
+
+def get_field_types(
+    django_model: DjModelType, proto_cls: ProtoMsgType
+) -> typing.Dict[str, DjFieldType]:
+    """
+    The django field type of every protobuf field that has a matching django field.
+    Precomputed for the registered pairs when the registry is frozen.
+    """
+    try:
+        return _FIELD_TYPES[django_model, proto_cls]
+    except KeyError:
+        pass
+
+    field_map = build_django_field_map(django_model)
+    field_types = {}
+    for field_name in proto_cls.DESCRIPTOR.fields_by_name:
+        try:
+            field_types[field_name] = resolve_django_field_type(
+                django_model, field_map, field_name
+            )
+        except ValueError:
+            # reported by the conversions, unless it's a custom field
+            pass
+
+    _FIELD_TYPES[django_model, proto_cls] = field_types
+    return field_types
+
+
+def freeze_registry():
+    """
+    Check every registered (django model, protobuf class) pair,
+    precompute the lookup tables used by the conversions,
+    and prevent further registrations.
+
+    Called once, when the djpb app is ready.
+    Raises `ImproperlyConfigured` with all the problems that were found.
+    """
+    global _frozen
+
+    errors = []
+    for django_model, proto_classes in MODEL_TO_PROTO_CLS.items():
+        _PROTO_CLS_BY_NAME[django_model] = _get_proto_cls_by_name(django_model)
+        for proto_cls in proto_classes:
+            errors += check_model(django_model, proto_cls)
+
+    if errors:
+        raise ImproperlyConfigured(
+            "Invalid djpb registry:\n" + "\n".join(f"- {e}" for e in errors)
+        )
+
+    _frozen = True
+
+
+def check_model(django_model: DjModelType, proto_cls: ProtoMsgType) -> typing.List[str]:
+    prefix = f"{django_model._meta.label} <-> {proto_cls.DESCRIPTOR.full_name}:"
+    proto_meta = get_proto_meta(proto_cls)
+    field_types = get_field_types(django_model, proto_cls)
+    fields_by_name = proto_cls.DESCRIPTOR.fields_by_name
+    errors = []
+
+    for field_name, proto_field in fields_by_name.items():
+        if field_name in proto_meta.custom:
+            continue
+        if field_name.endswith("__set_null"):
+            target = field_name[: -len("__set_null")]
+            if target not in field_types and target not in proto_meta.custom:
+                errors.append(
+                    f"{prefix} {field_name!r} refers to a field that doesn't exist."
+                )
+            continue
+        if field_name.endswith(PAGE_TOKEN_SUFFIX):
+            target = field_name[: -len(PAGE_TOKEN_SUFFIX)]
+            if target not in proto_meta.page_sizes:
+                errors.append(
+                    f"{prefix} {field_name!r} refers to a field that isn't in `ProtoMeta.page_sizes`."
+                )
+            continue
+        if field_name not in field_types:
+            errors.append(
+                f"{prefix} protobuf field {field_name!r} does not exist in the django model."
+            )
+            continue
+
+    for field_name in proto_meta.custom:
+        if field_name not in fields_by_name:
+            errors.append(
+                f"{prefix} custom field {field_name!r} does not exist in the protobuf message."
+            )
+    for field_name, page_size in proto_meta.page_sizes.items():
+        proto_field = fields_by_name.get(field_name)
+        if proto_field is None or not field_is_repeated(proto_field):
+            errors.append(
+                f"{prefix} paginated field {field_name!r} is not a repeated protobuf field."
+            )
+        elif f"{field_name}{PAGE_TOKEN_SUFFIX}" not in fields_by_name:
+            # otherwise a truncated relation can't be told apart from a complete one
+            errors.append(
+                f"{prefix} paginated field {field_name!r} requires a "
+                f"`string {field_name}{PAGE_TOKEN_SUFFIX}` protobuf field."
+            )
+        if not isinstance(page_size, int) or page_size < 1:
+            errors.append(
+                f"{prefix} page size of {field_name!r} must be a positive integer."
+            )
+    for field_name in [proto_meta.version_field, *(proto_meta.unique_fields or ())]:
+        if field_name is None:
+            continue
+        try:
+            django_model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            errors.append(
+                f"{prefix} field {field_name!r} (from ProtoMeta) does not exist in the django model."
+            )
+
+    return errors
+
+
+def check_registry(app_configs=None, **kwargs):
+    """
+    System check for configurations that only break some of the conversions,
+    so they're reported as warnings instead of failing at startup.
+    """
+    warnings = []
+    for django_model, proto_classes in MODEL_TO_PROTO_CLS.items():
+        for proto_cls in proto_classes:
+            warnings += [
+                checks.Warning(
+                    msg,
+                    hint="Register the message type using `register_model()`, "
+                    "if it's used by `proto_to_django()`.",
+                    obj=django_model,
+                    id="djpb.W002",
+                )
+                for msg in check_related_messages(django_model, proto_cls)
+            ]
+    return warnings
+
+
+def check_related_messages(
+    django_model: DjModelType, proto_cls: ProtoMsgType
+) -> typing.List[str]:
+    # slim message types used only for reads (e.g. references) don't need to be registered,
+    # but saving requires the related model of every nested message
+    prefix = f"{django_model._meta.label} <-> {proto_cls.DESCRIPTOR.full_name}:"
+    custom = get_proto_meta(proto_cls).custom
+    field_types = get_field_types(django_model, proto_cls)
+    problems = []
+
+    for field_name, proto_field in proto_cls.DESCRIPTOR.fields_by_name.items():
+        message_type = proto_field.message_type
+        if (
+            field_name in custom
+            or field_name not in field_types
+            or message_type is None
+            or message_type.name.endswith("__oneof")
+        ):
+            continue
+        try:
+            related_model = django_model._meta.get_field(field_name).related_model
+        except FieldDoesNotExist:
+            continue
+        if related_model is None:
+            continue
+        if PROTO_CLS_TO_MODEL.get(message_type._concrete_class) is not related_model:
+            problems.append(
+                f"{prefix} the message type {message_type.full_name!r} of {field_name!r} "
+                f"is not registered for {related_model._meta.label!r}, "
+                f"so it can't be saved."
+            )
+
+    return problems
@@ -0,0 +1,16 @@
+from .context import get_using
+
+
+class ConversionRouter:
+    """
+    Route the queries made during a conversion to the conversion's database alias,
+    including the ones that djpb doesn't make itself (e.g. lazy related object access inside custom fields).
+
+    Add `"djpb.routers.ConversionRouter"` to the top of `settings.DATABASE_ROUTERS` to use it.
+    """
+
+    def db_for_read(self, model, **hints):
+        return get_using()
+
+    def db_for_write(self, model, **hints):
+        return get_using()
@@ -1,3 +1,4 @@
+import inspect
 import typing
 import typing as T
 import uuid
@@ -9,8 +10,22 @@ from django.db.models.fields.related_descriptors import ReverseManyToOneDescript
 from django.utils import timezone
 from google.protobuf.json_format import MessageToDict, ParseDict
 from google.protobuf.struct_pb2 import Value
-
-from djpb.util import get_django_field_repr, create_proto_field_obj
+from google.protobuf.timestamp_pb2 import Timestamp
+
+from djpb.context import get_context, get_using
+from djpb.util import (
+    get_django_field_repr,
+    field_has_presence,
+    field_is_repeated,
+    json_scalar,
+    json_value,
+    get_related_queryset,
+    link_related,
+    MaskTree,
+)
+from .pagination import get_page
+from .planner import SavePlan, obj_repr
+from .streaming import ChildStream, save_child_stream
 from .gen_proto import (
     DJANGO_TO_PROTO_FIELD_TYPE,
     PROTO_VALUE_TYPE,
@@ -49,11 +64,29 @@ class FieldSerializer:
     def update_django(self, node: "SaveNode", field_name: str, value):
         setattr(node.django_obj, field_name, value)
 
+    def update_dict(self, data: dict, key: str, proto_field, value):
+        """Set the JSON form of `value` in `data`, exactly like `MessageToDict()` would."""
+        if field_is_repeated(proto_field):
+            if value:
+                data[key] = [json_scalar(proto_field, v) for v in value]
+        elif field_has_presence(proto_field) or value != proto_field.default_value:
+            data[key] = json_scalar(proto_field, value)
+
 
 DEFAULT_SERIALIZER = FieldSerializer()
 SERIALIZERS: T.Dict[DjFieldType, FieldSerializer] = {}
 
 
+def resolve_serializer(django_field_type: DjFieldType) -> FieldSerializer:
+    # walk down the MRO to resolve the serializer for this field type
+    for base_type in inspect.getmro(django_field_type):
+        try:
+            return SERIALIZERS[base_type]
+        except KeyError:
+            continue
+    return DEFAULT_SERIALIZER
+
+
 @register_serializer
 class DateTimeFieldSerializer(FieldSerializer):
     field_types = (models.DateTimeField,)
@@ -63,6 +96,11 @@ class DateTimeFieldSerializer(FieldSerializer):
         field = getattr(proto_obj, field_name)
         field.FromDatetime(value)
 
+    def update_dict(self, data, key, proto_field, value):
+        field = Timestamp()
+        field.FromDatetime(value)
+        data[key] = field.ToJsonString()
+
     def update_django(self, node, field_name, value):
         value = value.ToDatetime()
         value = value.replace(tzinfo=timezone.utc)
@@ -78,6 +116,10 @@ class UUIDFieldSerializer(FieldSerializer):
         value = str(value)
         super().update_proto(proto_obj, field_name, value)
 
+    def update_dict(self, data, key, proto_field, value):
+        value = str(value)
+        super().update_dict(data, key, proto_field, value)
+
     def update_django(self, node, field_name, value):
         value = uuid.UUID(value)
         super().update_django(node, field_name, value)
@@ -96,15 +138,21 @@ class FileFieldSerializer(FieldSerializer):
             return False
 
     def update_proto(self, proto_obj, field_name, value):
+        value = self.to_str(value)
+        super().update_proto(proto_obj, field_name, value)
+
+    def update_dict(self, data, key, proto_field, value):
+        value = self.to_str(value)
+        super().update_dict(data, key, proto_field, value)
+
+    def to_str(self, value) -> str:
         if self.use_url:
             try:
-                value = value.url
+                return value.url
             except ValueError:
-                value = ""
+                return ""
         else:
-            value = str(value)
-
-        super().update_proto(proto_obj, field_name, value)
+            return str(value)
 
     def update_django(self, node, field_name, value):
         if "://" in value:
@@ -132,179 +180,345 @@ class JSONFieldSerializer(FieldSerializer):
         value = MessageToDict(value)
         super().update_django(node, field_name, value)
 
+    def update_dict(self, data, key, proto_field, value):
+        data[key] = json_value(value)
+
 
 class DeferredSerializer(FieldSerializer):
-    def save(
-        self,
-        django_obj: DjModel,
-        field_name: str,
-        child_node: "SaveNode",
-        do_full_clean: bool,
-    ):
+    # negative: saved before the parent object, non-negative: saved after it
+    save_order: int
+
+    def plan(self, plan: "SavePlan", node: "SaveNode", child: "SaveNodeChild"):
         raise NotImplementedError()
 
+    def get_linked_fields(
+        self, node: "SaveNode", child: "SaveNodeChild"
+    ) -> T.Iterable[T.Tuple["SaveNode", str, DjModel]]:
+        """
+        The (node, field name, related object) of each field that is set by the plan,
+        and hence can't be validated before the plan is executed.
+        """
+        return ()
+
 
 @register_serializer
 class OneToXSerializer(DeferredSerializer):
     field_types = (models.OneToOneField, models.ForeignKey)
+    save_order = -1
 
     def update_proto(self, proto_obj, field_name, value):
         from djpb import django_to_proto
 
+        # fill the parent's sub-message in place
         field = getattr(proto_obj, field_name)
-        value = django_to_proto(value, create_proto_field_obj(proto_obj, field_name))
-        field.CopyFrom(value)
+        field.SetInParent()
+        django_to_proto(value, field)
+
+    def update_dict(self, data, key, proto_field, value):
+        from djpb.django_to_dict import django_to_dict
+
+        data[key] = django_to_dict(value, proto_field.message_type._concrete_class)
 
     def update_django(self, node, field_name, value):
         from djpb.proto_to_django import _proto_to_django
 
-        child_node = _proto_to_django(value)
+        child_node = _proto_to_django(value, mask=node.get_child_mask(field_name))
+        # link it right away, so `clean()` can read it during validation
+        # (the pk is copied when the object is saved, see `Model._prepare_related_fields_for_save()`)
+        link_related(node.django_obj, field_name, child_node.django_obj)
         node.add_child(SaveNodeChild(self, field_name, child_node))
 
-    def save(self, django_obj, field_name, child_node, do_full_clean):
+    def get_linked_fields(self, node, child):
+        return [(node, child.field_name, child.node.django_obj)]
+
+    def plan(self, plan, node, child):
+        django_obj = node.django_obj
+        child_node = child.node
+
         # save child object
-        child_node.save(do_full_clean)
-        rel_obj = child_node.django_obj
+        plan.add_node(child_node)
 
         # set parent object's field to child object
-        setattr(django_obj, field_name, rel_obj)
+        plan.add_step(
+            f"SET {obj_repr(django_obj)}.{child.field_name} = {obj_repr(child_node.django_obj)}",
+            lambda: setattr(django_obj, child.field_name, child_node.django_obj),
+        )
+
 
-        # save parent object
-        if do_full_clean:
-            django_obj.full_clean()
-        django_obj.save()
+def _get_message_cls(proto_obj: ProtoMsg, field_name: str):
+    return proto_obj.DESCRIPTOR.fields_by_name[field_name].message_type._concrete_class
 
 
 class ManyToXSerializer(DeferredSerializer):
     def update_django(self, node, field_name, value):
         from djpb.proto_to_django import _proto_to_django
 
+        ctx = get_context()
+        upsert = ctx is not None and ctx.upsert
+        using = get_using()
+
         # get existing django objs queryset
         if node.django_obj.id:
             # The related model mangaer, type: django.db.models.fields.RelatedManager / ManyRelatedManager
             rel_manager = getattr(node.django_obj, field_name)
             # The releated models's manager, type: Manager
-            rel_model_manager = rel_manager.model.objects
+            rel_model_manager = rel_manager.model.objects.db_manager(using)
+            to_keep = []
         else:
-            rel_manager = None
             rel_model_manager = None
-
-        to_keep = []
+            to_keep = None
 
         # for each pb obj in value
+        mask = node.get_child_mask(field_name)
         child_nodes = []
         for pb_obj in value:
+            dj_obj = None
             # try to fetch corresponding dj obj from db
             if rel_model_manager and hasattr(pb_obj, "id") and pb_obj.id:
-                dj_obj = rel_model_manager.get(id=pb_obj.id)
+                # upserts don't need the existing obj
+                if not upsert:
+                    dj_obj = rel_model_manager.get(id=pb_obj.id)
                 to_keep.append(pb_obj.id)  # dont delete this obj!
-            else:
-                dj_obj = None
             # convert pb obj to django obj
-            child_nodes.append(_proto_to_django(pb_obj, dj_obj))
-        node.add_child(SaveNodeChild(self, field_name, tuple(child_nodes)))
+            child_nodes.append(_proto_to_django(pb_obj, dj_obj, mask))
 
-        # delete dj objs that are not in input pb objs
-        if rel_manager:
-            self.clean_objs(rel_manager, to_keep)
+        # dj objs that are not in input pb objs are deleted when the plan is executed
+        node.add_child(SaveNodeChild(self, field_name, tuple(child_nodes), to_keep))
 
     def clean_objs(self, rel_manager, obj_ids_to_keep: typing.List[int]):
         raise NotImplementedError()
 
+    def get_rel_manager(self, django_obj: DjModel, field_name: str, using: str = None):
+        rel_manager = getattr(django_obj, field_name)
+        if using is not None:
+            rel_manager = rel_manager.db_manager(using)
+        return rel_manager
+
+    def plan_clean_objs(self, plan: "SavePlan", node: "SaveNode", child: "SaveNodeChild"):
+        if child.keep_ids is None:
+            return
+        django_obj = node.django_obj
+        plan.add_step(
+            f"DELETE {obj_repr(django_obj)}.{child.field_name} NOT IN {child.keep_ids!r}",
+            lambda: self.clean_objs(
+                self.get_rel_manager(django_obj, child.field_name, plan.using),
+                child.keep_ids,
+            ),
+        )
+
     def update_proto(self, proto_obj, field_name, value):
-        from djpb import django_to_proto
+        from djpb.django_to_proto import _django_to_proto_repeated
 
+        # build new elements of the repeated field in place
         field = getattr(proto_obj, field_name)
-        msgs = [
-            django_to_proto(obj, create_proto_field_obj(proto_obj, field_name))
-            for obj in value.all()
+        del field[:]
+        _django_to_proto_repeated(
+            field,
+            get_related_queryset(value, get_using()),
+            _get_message_cls(proto_obj, field_name),
+        )
+
+    def update_dict(self, data, key, proto_field, value):
+        from djpb.django_to_dict import django_to_dict
+
+        proto_cls = proto_field.message_type._concrete_class
+        dicts = [
+            django_to_dict(obj, proto_cls)
+            for obj in get_related_queryset(value, get_using())
         ]
+        if dicts:
+            data[key] = dicts
+
+    def update_proto_page(self, proto_obj, field_name, value, page_size: int) -> str:
+        """Like `update_proto()`, for the first page of the relation. Returns the next page token."""
+        from djpb.django_to_proto import _django_to_proto_repeated
+
+        objs, token = get_page(value, page_size, using=get_using())
+        field = getattr(proto_obj, field_name)
         del field[:]
-        field.extend(msgs)
+        _django_to_proto_repeated(field, objs, _get_message_cls(proto_obj, field_name))
+        return token
+
+    def update_dict_page(self, data, key, proto_field, value, page_size: int) -> str:
+        from djpb.django_to_dict import django_to_dict
+
+        objs, token = get_page(value, page_size, using=get_using())
+        proto_cls = proto_field.message_type._concrete_class
+        if objs:
+            data[key] = [django_to_dict(obj, proto_cls) for obj in objs]
+        return token
 
 
 @register_serializer
 class ManyToOneSerializer(ManyToXSerializer):
     field_types = (ReverseManyToOneDescriptor,)
+    save_order = 1
 
     def clean_objs(self, rel_manager, obj_ids_to_keep: typing.List[int]):
         # delete dj objs that are no longer in use
         rel_manager.exclude(id__in=obj_ids_to_keep).delete()
 
-    def save(self, django_obj, field_name, child_nodes, do_full_clean):
-        # save parent object
-        if do_full_clean:
-            django_obj.full_clean()
-        django_obj.save()
+    def get_linked_fields(self, node, child):
+        rel_name = getattr(type(node.django_obj), child.field_name).field.name
+        return [
+            (child_node, rel_name, node.django_obj) for child_node in child.nodes
+        ]
 
-        for child_node in child_nodes:
-            # get child object
-            rel_obj = child_node.django_obj
+    def update_django(self, node, field_name, value):
+        ctx = get_context()
+        chunk_size = ctx and ctx.chunk_size
+        if not chunk_size or len(value) <= chunk_size:
+            super().update_django(node, field_name, value)
+            # link the children right away, so `clean()` can read their parent during validation
+            child = node._children[field_name]
+            for child_node, rel_name, obj in self.get_linked_fields(node, child):
+                link_related(child_node.django_obj, rel_name, obj)
+            return
+
+        # too large to hold all the children in memory at once
+        stream = ChildStream(
+            value,
+            node.get_child_mask(field_name),
+            chunk_size,
+            ctx.upsert,
+            ctx.using,
+        )
+        keep_ids = [] if node.django_obj.id else None
+        node.add_child(SaveNodeChild(self, field_name, stream, keep_ids))
+
+    def plan(self, plan, node, child):
+        django_obj = node.django_obj
+        rel_name = getattr(type(django_obj), child.field_name).field.name
+
+        if isinstance(child.node, ChildStream):
+            plan.add_step(
+                f"STREAM {obj_repr(django_obj)}.{child.field_name} ({child.node.describe()})",
+                lambda: save_child_stream(
+                    plan,
+                    django_obj,
+                    child.field_name,
+                    child.node,
+                    cleanup=child.keep_ids is not None,
+                ),
+            )
+            return
 
+        self.plan_clean_objs(plan, node, child)
+
+        for child_node in child.node:
             # set child object's field to parent object
-            rel_manager = getattr(django_obj, field_name)
-            rel_name = rel_manager.field.name
-            setattr(rel_obj, rel_name, django_obj)
+            child_node.fields.add(rel_name)
+            plan.add_step(
+                f"SET {obj_repr(child_node.django_obj)}.{rel_name} = {obj_repr(django_obj)}",
+                setattr,
+                child_node.django_obj,
+                rel_name,
+                django_obj,
+            )
 
             # save child object
-            child_node.save(do_full_clean)
+            plan.add_node(child_node)
 
 
 @register_serializer
 class ManyToManySerializer(ManyToXSerializer):
     field_types = (models.ManyToManyField,)
+    save_order = 2
 
     def clean_objs(self, rel_manager, obj_ids_to_keep: typing.List[int]):
         # remove objs that are removed from the m2m relation
         to_remove = rel_manager.exclude(id__in=obj_ids_to_keep).values_list(
             "id", flat=True
         )
-        for rel_obj_id in to_remove:
-            rel_manager.remove(rel_obj_id)
+        rel_manager.remove(*to_remove)
 
-    def save(self, django_obj, field_name, child_nodes, do_full_clean):
-        # save parent object
-        if do_full_clean:
-            django_obj.full_clean()
-        django_obj.save()
+    def plan(self, plan, node, child):
+        django_obj = node.django_obj
+        child_nodes = child.node
 
-        for child_node in child_nodes:
-            # save child object
-            child_node.save(do_full_clean)
+        self.plan_clean_objs(plan, node, child)
 
-            # add child to parent's m2m manager
-            rel_manager = getattr(django_obj, field_name)
-            rel_obj = child_node.django_obj
-            rel_manager.add(rel_obj)
+        # save child objects
+        for child_node in child_nodes:
+            plan.add_node(child_node)
+
+        # add children to parent's m2m manager, in a single query
+        if not child_nodes:
+            return
+        plan.add_step(
+            f"ADD {obj_repr(django_obj)}.{child.field_name} = "
+            f"[{', '.join(obj_repr(n.django_obj) for n in child_nodes)}]",
+            lambda: self.get_rel_manager(django_obj, child.field_name, plan.using).add(
+                *[n.django_obj for n in child_nodes]
+            ),
+        )
 
 
 class SaveNodeChild(T.NamedTuple):
     serializer: DeferredSerializer
     field_name: str
-    node: "SaveNode"
+    node: T.Union["SaveNode", T.Tuple["SaveNode", ...], ChildStream]
+    # pks of existing related objects to keep, `None` to skip cleanup
+    keep_ids: T.Optional[T.List] = None
 
-    def __hash__(self) -> int:
-        return hash(self.node)
+    @property
+    def nodes(self) -> T.Tuple["SaveNode", ...]:
+        if isinstance(self.node, SaveNode):
+            return (self.node,)
+        if isinstance(self.node, tuple):
+            return self.node
+        # streamed children are decoded later
+        return ()
 
 
 @dataclass
 class SaveNode:
     django_obj: DjModel
+    # the fields to update, `None` for all of them (see `field_mask_to_tree()`)
+    mask: T.Optional[MaskTree] = None
 
     def __post_init__(self):
-        self._children: T.Set[SaveNodeChild] = set()
+        self._children: T.Dict[str, SaveNodeChild] = {}
+        # names of the fields that were set from the proto message
+        self.fields: T.Set[str] = set()
+        # if set, save the object using an upsert on these unique fields
+        self.upsert_on: T.Optional[T.Sequence[str]] = None
+        # if set, the (version field, expected version) that the update is conditional on
+        self.version_check: T.Optional[T.Tuple[str, T.Any]] = None
 
     def __hash__(self) -> int:
         return id(self.django_obj)
 
+    @property
+    def children(self) -> T.Iterable[SaveNodeChild]:
+        return self._children.values()
+
     def add_child(self, child: SaveNodeChild):
-        self._children.add(child)
+        self._children[child.field_name] = child
 
-    def save(self, do_full_clean: bool):
-        if self._children:
-            for serializer, field_name, child_node in self._children:
-                serializer.save(self.django_obj, field_name, child_node, do_full_clean)
-        else:
-            if do_full_clean:
-                self.django_obj.full_clean()
-            self.django_obj.save()
+    def is_upsert(self) -> bool:
+        if not self.upsert_on:
+            return False
+        # a new object without a pk can't conflict on it, so it's inserted normally
+        # (also, `bulk_create()` doesn't return the pk of upserted rows before Django 5.0)
+        pk_name = self.django_obj._meta.pk.name
+        return not (pk_name in self.upsert_on and self.django_obj.pk is None)
+
+    def skip_cleanup(self, field_name: str):
+        # keep the existing related objects that aren't in the message
+        child = self._children.get(field_name)
+        if child is not None:
+            self._children[field_name] = child._replace(keep_ids=None)
+
+    def get_child_mask(self, field_name: str) -> T.Optional[MaskTree]:
+        if self.mask is None:
+            return None
+        return self.mask.get(field_name)
+
+    def plan(self, using: str = None) -> SavePlan:
+        plan = SavePlan(using)
+        plan.add_root(self)
+        return plan
+
+    def save(self, do_full_clean: bool, using: str = None):
+        self.plan(using).execute(do_full_clean)
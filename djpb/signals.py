@@ -1,7 +1,25 @@
 from django.dispatch import Signal
 
-pre_proto_to_django = Signal()
-post_proto_to_django = Signal()
+# Senders are the django model classes.
+# Signals are only sent if they have receivers, so connecting none costs (almost) nothing.
+# `use_caching` makes sending cheap for models that have no receivers of their own.
 
-pre_django_to_proto = Signal()
-post_django_to_proto = Signal()
+pre_proto_to_django = Signal(use_caching=True)
+post_proto_to_django = Signal(use_caching=True)
+
+pre_django_to_proto = Signal(use_caching=True)
+post_django_to_proto = Signal(use_caching=True)
+
+# Sent once per model by the bulk conversions, with `pairs`: a list of (django_obj, proto_obj) tuples.
+# `post_proto_to_django_many` is sent after the objects are saved, inside the same transaction.
+post_proto_to_django_many = Signal(use_caching=True)
+post_django_to_proto_many = Signal(use_caching=True)
+
+
+def send_many(signal: Signal, pairs):
+    # group by model, so receivers can filter by sender
+    by_model = {}
+    for django_obj, proto_obj in pairs:
+        by_model.setdefault(type(django_obj), []).append((django_obj, proto_obj))
+    for django_model, model_pairs in by_model.items():
+        signal.send(django_model, pairs=model_pairs)
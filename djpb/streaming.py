@@ -0,0 +1,163 @@
+import typing
+from dataclasses import dataclass
+
+from .context import conversion_context
+from .planner import SavePlan
+from .stubs import DjModel, ProtoMsg
+from .util import MaskTree
+from .validation import validate_nodes
+
+# to avoid circular import
+if False:
+    from .serializers import SaveNode
+
+
+@dataclass
+class ChildStream:
+    """
+    The messages of a large repeated many-to-one relation,
+    that are decoded, validated & saved in chunks when the plan is executed,
+    instead of being decoded upfront.
+    """
+
+    values: typing.Sequence[ProtoMsg]
+    mask: typing.Optional[MaskTree]
+    chunk_size: int
+    # options of the conversion that created the stream
+    upsert: bool
+    using: typing.Optional[str]
+
+    def describe(self) -> str:
+        return f"{len(self.values)} object(s), in chunks of {self.chunk_size}"
+
+
+def save_child_stream(
+    plan: SavePlan,
+    parent: DjModel,
+    field_name: str,
+    stream: ChildStream,
+    cleanup: bool,
+):
+    """
+    Save the children of `parent` in `stream`, one chunk at a time.
+
+    Plain children (without relations of their own) are written using
+    `bulk_create()` / `bulk_update()`, which skip `save()` and the model signals.
+    If `cleanup` is set, the children of `parent` that aren't in the stream are deleted
+    after the last chunk is saved.
+    """
+    from .proto_to_django import _proto_to_django
+
+    descriptor = getattr(type(parent), field_name)
+    rel_name = descriptor.field.name
+    child_model = descriptor.rel.related_model
+    child_manager = child_model._base_manager.db_manager(stream.using)
+
+    # pks of the saved children
+    kept_pks = set()
+
+    with conversion_context(upsert=stream.upsert, using=stream.using):
+        for start in range(0, len(stream.values), stream.chunk_size):
+            chunk = stream.values[start : start + stream.chunk_size]
+
+            # fetch the existing children of this chunk in a single query
+            pks = [pb_obj.id for pb_obj in chunk if getattr(pb_obj, "id", None)]
+            if pks and not stream.upsert:
+                existing = child_model.objects.db_manager(stream.using).in_bulk(pks)
+            else:
+                existing = {}
+
+            nodes = []
+            for pb_obj in chunk:
+                pk = getattr(pb_obj, "id", None)
+                dj_obj = None
+                if pk and not stream.upsert:
+                    try:
+                        dj_obj = existing[pk]
+                    except KeyError:
+                        raise child_model.DoesNotExist(
+                            f"{child_model._meta.label}(pk={pk!r}) does not exist."
+                        )
+                node = _proto_to_django(pb_obj, dj_obj, stream.mask)
+                setattr(node.django_obj, rel_name, parent)
+                node.fields.add(rel_name)
+                nodes.append(node)
+
+            if plan.do_full_clean:
+                roots = [
+                    (f"{field_name}[{start + i}]", node) for i, node in enumerate(nodes)
+                ]
+                validate_nodes(roots, stream.using)
+            _save_chunk(nodes, child_manager, stream.using)
+            if cleanup:
+                kept_pks.update(node.django_obj.pk for node in nodes)
+
+    if cleanup:
+        _delete_stale(parent, field_name, kept_pks, stream)
+
+
+def _save_chunk(nodes: typing.List["SaveNode"], child_manager, using):
+    to_create = []
+    to_update = []
+    complex_nodes = []
+    for node in nodes:
+        if (
+            node.is_upsert()
+            or node.version_check
+            or any(c.nodes or c.keep_ids is not None for c in node.children)
+        ):
+            complex_nodes.append(node)
+        elif node.django_obj._state.adding:
+            to_create.append(node)
+        else:
+            to_update.append(node)
+
+    if to_create:
+        child_manager.bulk_create([node.django_obj for node in to_create])
+
+    if to_update:
+        fields = set()
+        for node in to_update:
+            fields.update(node.fields)
+        update_fields = []
+        for field in to_update[0].django_obj._meta.concrete_fields:
+            if field.primary_key:
+                continue
+            if getattr(field, "auto_now", False):
+                # bulk_update() doesn't call pre_save()
+                for node in to_update:
+                    field.pre_save(node.django_obj, False)
+                update_fields.append(field.name)
+            elif field.name in fields:
+                update_fields.append(field.name)
+        if update_fields:
+            child_manager.bulk_update(
+                [node.django_obj for node in to_update], update_fields
+            )
+
+    if complex_nodes:
+        plan = SavePlan(using)
+        for node in complex_nodes:
+            plan.add_root(node)
+        # already validated
+        plan.execute(do_full_clean=False)
+
+
+def _delete_stale(
+    parent: DjModel, field_name: str, kept_pks: typing.Set, stream: ChildStream
+):
+    rel_manager = getattr(parent, field_name).db_manager(stream.using)
+    pks = rel_manager.order_by("pk").values_list("pk", flat=True)
+    # walk the existing children by pk, one chunk at a time
+    last_pk = None
+    while True:
+        if last_pk is None:
+            batch = list(pks[: stream.chunk_size])
+        else:
+            batch = list(pks.filter(pk__gt=last_pk)[: stream.chunk_size])
+        if not batch:
+            break
+        last_pk = batch[-1]
+        stale_pks = [pk for pk in batch if pk not in kept_pks]
+        if stale_pks:
+            rel_manager.filter(pk__in=stale_pks).delete()
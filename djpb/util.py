@@ -1,6 +1,15 @@
+import base64
+import math
+import struct
 import typing
 
-from django.db.models.fields.related_descriptors import ForeignKeyDeferredAttribute
+from django.db.models.fields.related_descriptors import (
+    ForeignKeyDeferredAttribute,
+    ForwardManyToOneDescriptor,
+    ReverseOneToOneDescriptor,
+)
+from google.protobuf.descriptor import FieldDescriptor
+from google.protobuf.internal import type_checkers
 
 from djpb.stubs import DjModel, DjField, DjModelType, DjFieldType, ProtoMsg
 
@@ -46,11 +55,188 @@ def get_django_field_repr(
     return f"field '{django_model.__qualname__}.{field_name}' of type {django_field_type.__qualname__!r}"
 
 
+def none_value_error(
+    django_field_type: DjFieldType, django_model: DjModelType, field_name: str
+) -> ValueError:
+    django_field_repr = get_django_field_repr(
+        django_field_type, django_model, field_name
+    )
+    return ValueError(
+        f"Can't serialize None-type value for {django_field_repr}, "
+        f"because protobuf doesn't support null types.\n"
+        f"You can wrap the field with a `oneof` as a workaround."
+    )
+
+
 def disjoint(x, y):
     return set(x).isdisjoint(y)
 
 
 def create_proto_field_obj(proto_obj: ProtoMsg, field_name: str) -> ProtoMsg:
-    fields = {field.name: field for field in proto_obj.DESCRIPTOR.fields}
-    field = fields[field_name]
+    field = proto_obj.DESCRIPTOR.fields_by_name[field_name]
     return field.message_type._concrete_class()
+
+
+def field_is_repeated(proto_field) -> bool:
+    try:
+        return proto_field.is_repeated
+    except AttributeError:
+        # older protobuf versions
+        return proto_field.label == FieldDescriptor.LABEL_REPEATED
+
+
+def field_has_presence(proto_field) -> bool:
+    """Check whether a proto field can be in an "unset" state, without creating a message."""
+    try:
+        return proto_field.has_presence
+    except AttributeError:
+        # older protobuf versions
+        if field_is_repeated(proto_field):
+            return False
+        return (
+            proto_field.message_type is not None
+            or proto_field.containing_oneof is not None
+            or proto_field.file.syntax == "proto2"
+        )
+
+
+def json_scalar(proto_field, value):
+    """Convert a scalar value to its JSON form, exactly like `MessageToDict()` would."""
+    cpp_type = proto_field.cpp_type
+    if cpp_type == FieldDescriptor.CPPTYPE_ENUM:
+        if isinstance(value, str):
+            return value
+        enum_value = proto_field.enum_type.values_by_number.get(value)
+        if enum_value is None:
+            return value
+        return enum_value.name
+    elif cpp_type == FieldDescriptor.CPPTYPE_STRING:
+        if proto_field.type == FieldDescriptor.TYPE_BYTES:
+            return base64.b64encode(value).decode("utf-8")
+        return str(value)
+    elif cpp_type == FieldDescriptor.CPPTYPE_BOOL:
+        return bool(value)
+    elif cpp_type in _INT64_CPP_TYPES:
+        return str(int(value))
+    elif cpp_type in _INT32_CPP_TYPES:
+        return int(value)
+    elif cpp_type in _FLOAT_CPP_TYPES:
+        value = float(value)
+        if math.isinf(value):
+            return "-Infinity" if value < 0 else "Infinity"
+        if math.isnan(value):
+            return "NaN"
+        if cpp_type == FieldDescriptor.CPPTYPE_FLOAT:
+            # round-trip through a 32-bit float, like the proto field would
+            value = struct.unpack("<f", struct.pack("<f", value))[0]
+            return type_checkers.ToShortestFloat(value)
+        return value
+    return value
+
+
+_INT64_CPP_TYPES = {FieldDescriptor.CPPTYPE_INT64, FieldDescriptor.CPPTYPE_UINT64}
+_INT32_CPP_TYPES = {FieldDescriptor.CPPTYPE_INT32, FieldDescriptor.CPPTYPE_UINT32}
+_FLOAT_CPP_TYPES = {FieldDescriptor.CPPTYPE_FLOAT, FieldDescriptor.CPPTYPE_DOUBLE}
+
+
+def json_value(value):
+    """Convert a python value to the JSON form of a `google.protobuf.Value`."""
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        # all numbers are doubles in a `google.protobuf.Value`
+        return float(value)
+    if isinstance(value, dict):
+        return {k: json_value(v) for k, v in value.items()}
+    return [json_value(v) for v in value]
+
+
+def get_django_value(django_obj: DjModel, field_name: str, using: str = None):
+    """
+    Same as `getattr(django_obj, field_name)`,
+    except that one-to-one & many-to-one related objects are fetched from the database `using`.
+    """
+    if using is None:
+        return getattr(django_obj, field_name)
+
+    descriptor = getattr(type(django_obj), field_name, None)
+
+    if isinstance(descriptor, ForwardManyToOneDescriptor):
+        field = descriptor.field
+        if field.is_cached(django_obj):
+            return field.get_cached_value(django_obj)
+        if None in field.get_local_related_value(django_obj):
+            value = None
+        else:
+            qs = descriptor.get_queryset(instance=django_obj).using(using)
+            try:
+                value = qs.get(field.get_reverse_related_filter(django_obj))
+            except qs.model.DoesNotExist:
+                raise descriptor.RelatedObjectDoesNotExist(
+                    f"{type(django_obj).__name__} has no {field_name}."
+                )
+        field.set_cached_value(django_obj, value)
+        return value
+
+    if isinstance(descriptor, ReverseOneToOneDescriptor):
+        related = descriptor.related
+        if related.is_cached(django_obj):
+            value = related.get_cached_value(django_obj)
+        else:
+            qs = descriptor.get_queryset(instance=django_obj).using(using)
+            try:
+                value = qs.get(**related.field.get_forward_related_filter(django_obj))
+            except qs.model.DoesNotExist:
+                value = None
+            related.set_cached_value(django_obj, value)
+        if value is None:
+            raise descriptor.RelatedObjectDoesNotExist(
+                f"{type(django_obj).__name__} has no {field_name}."
+            )
+        return value
+
+    return getattr(django_obj, field_name)
+
+
+def link_related(django_obj: DjModel, field_name: str, related_obj: DjModel):
+    """
+    Same as `setattr(django_obj, field_name, related_obj)` for a foreign key,
+    but without binding unsaved objects to a database,
+    which the descriptor does using the routers, before the save plan chooses one.
+    """
+    field = django_obj._meta.get_field(field_name)
+    for lh_field, rh_field in field.related_fields:
+        setattr(django_obj, lh_field.attname, getattr(related_obj, rh_field.attname))
+    field.set_cached_value(django_obj, related_obj)
+
+
+def get_related_queryset(manager, using: str = None):
+    qs = manager.all()
+    # prefetched results are already in memory
+    if using is not None and qs._result_cache is None:
+        qs = qs.using(using)
+    return qs
+
+
+# field name -> sub-tree, or `None` for the whole field
+MaskTree = typing.Dict[str, typing.Optional["MaskTree"]]
+
+
+def field_mask_to_tree(paths: typing.Iterable[str]) -> MaskTree:
+    """
+    Convert the paths of a `FieldMask` to a tree, e.g.
+    `["title", "customer.name"]` -> `{"title": None, "customer": {"name": None}}`
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for name in parents:
+            child = node.get(name, {})
+            if child is None:
+                # the whole parent is already included
+                break
+            node = node.setdefault(name, child)
+        else:
+            node[leaf] = None
+    return tree
@@ -0,0 +1,311 @@
+import typing
+from collections import defaultdict
+
+from django.core.exceptions import NON_FIELD_ERRORS, ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db.models import Q
+
+from .stubs import DjModel
+
+# to avoid circular import
+if False:
+    from .serializers import SaveNode
+
+# max number of values in a single `IN (...)` / `OR` lookup
+QUERY_BATCH_SIZE = 500
+
+ErrorDict = typing.Dict[str, typing.List[ValidationError]]
+
+
+class _NodeInfo(typing.NamedTuple):
+    node: "SaveNode"
+    # where the object came from in the input messages, e.g. `[0].items[2]`
+    path: str
+    # fields that are set by the save plan -> the objects they will point to
+    linked: typing.Dict[str, DjModel]
+    # fields that failed validation, skipped by the unique checks
+    invalid: typing.Set[str]
+
+
+def validate_nodes(
+    roots: typing.Iterable[typing.Tuple[str, "SaveNode"]], using: str = None
+):
+    """
+    Validate every object of a `SaveNode` graph before any of them is saved.
+
+    Field validators & `clean()` run in-memory for each object,
+    while foreign key and uniqueness checks are made using one set-based query per constraint.
+
+    Raises a `ValidationError` keyed by the field path inside the input messages,
+    e.g. `[0].items[2].sku`.
+    """
+    infos = _collect_nodes(roots)
+    errors: ErrorDict = defaultdict(list)
+
+    for info in infos:
+        _clean_obj(info, errors, using)
+    _check_foreign_keys(infos, errors, using)
+    _check_unique(infos, errors, using)
+
+    if errors:
+        raise ValidationError(dict(errors))
+
+
+def _collect_nodes(
+    roots: typing.Iterable[typing.Tuple[str, "SaveNode"]]
+) -> typing.List[_NodeInfo]:
+    paths: typing.Dict[int, typing.Tuple["SaveNode", str]] = {}
+    linked: typing.Dict[int, typing.Dict[str, DjModel]] = defaultdict(dict)
+
+    def visit(node: "SaveNode", path: str):
+        if id(node) in paths:
+            return
+        paths[id(node)] = (node, path)
+
+        for child in node.children:
+            for linked_node, field_name, obj in child.serializer.get_linked_fields(
+                node, child
+            ):
+                linked[id(linked_node)][field_name] = obj
+
+            if isinstance(child.node, tuple):
+                for i, child_node in enumerate(child.node):
+                    visit(child_node, _join_path(path, f"{child.field_name}[{i}]"))
+            else:
+                for child_node in child.nodes:
+                    visit(child_node, _join_path(path, child.field_name))
+
+    for path, root in roots:
+        visit(root, path)
+
+    return [
+        _NodeInfo(node, path, linked.get(key, {}), set())
+        for key, (node, path) in paths.items()
+    ]
+
+
+def _join_path(path: str, name: str) -> str:
+    if not path:
+        return name
+    return f"{path}.{name}"
+
+
+def _add_error(errors: ErrorDict, info: _NodeInfo, e: ValidationError):
+    for field_name, field_errors in e.update_error_dict({}).items():
+        if field_name == NON_FIELD_ERRORS:
+            key = info.path or NON_FIELD_ERRORS
+        else:
+            key = _join_path(info.path, field_name)
+            info.invalid.add(field_name)
+        errors[key].extend(field_errors)
+
+
+def _get_foreign_keys(django_obj: DjModel) -> typing.List[models.ForeignKey]:
+    return [
+        field
+        for field in django_obj._meta.concrete_fields
+        if isinstance(field, models.ForeignKey)
+    ]
+
+
+def _clean_obj(info: _NodeInfo, errors: ErrorDict, using: typing.Optional[str]):
+    django_obj = info.node.django_obj
+    # foreign keys are checked later, using a single query per field
+    exclude = set(info.linked)
+    exclude.update(field.name for field in _get_foreign_keys(django_obj))
+
+    try:
+        django_obj.full_clean(
+            exclude=exclude, validate_unique=False, validate_constraints=False
+        )
+    except ValidationError as e:
+        _add_error(errors, info, e)
+
+    # constraints that aren't plain unique constraints are checked one object at a time
+    exclude.update(info.invalid)
+    for model_class, constraints in django_obj.get_constraints():
+        for constraint in constraints:
+            if constraint in model_class._meta.total_unique_constraints:
+                continue
+            try:
+                constraint.validate(
+                    model_class,
+                    django_obj,
+                    exclude=exclude,
+                    using=using or DEFAULT_DB_ALIAS,
+                )
+            except ValidationError as e:
+                _add_error(errors, info, e)
+
+
+def _check_foreign_keys(
+    infos: typing.List[_NodeInfo], errors: ErrorDict, using: typing.Optional[str]
+):
+    to_check: typing.Dict[
+        models.ForeignKey, typing.List[typing.Tuple[_NodeInfo, typing.Any]]
+    ] = defaultdict(list)
+
+    for info in infos:
+        django_obj = info.node.django_obj
+        for field in _get_foreign_keys(django_obj):
+            if field.name in info.linked:
+                continue
+            # same as `Model.clean_fields()`, without the existence query
+            raw_value = getattr(django_obj, field.attname)
+            if field.blank and raw_value in field.empty_values:
+                continue
+            try:
+                value = field.to_python(raw_value)
+                models.Field.validate(field, value, django_obj)
+                field.run_validators(value)
+            except ValidationError as e:
+                _add_error(errors, info, ValidationError({field.name: e}))
+                continue
+            if value is not None:
+                to_check[field].append((info, value))
+
+    for field, pairs in to_check.items():
+        remote_model = field.remote_field.model
+        target = field.remote_field.field_name
+        qs = remote_model._base_manager.using(using).complex_filter(
+            field.get_limit_choices_to()
+        )
+
+        values = list({value for _, value in pairs})
+        existing = set()
+        for i in range(0, len(values), QUERY_BATCH_SIZE):
+            batch = values[i : i + QUERY_BATCH_SIZE]
+            existing.update(
+                qs.filter(**{f"{target}__in": batch}).values_list(target, flat=True)
+            )
+
+        for info, value in pairs:
+            if value in existing:
+                continue
+            e = ValidationError(
+                field.error_messages["invalid"],
+                code="invalid",
+                params={
+                    "model": remote_model._meta.verbose_name,
+                    "pk": value,
+                    "field": target,
+                    "value": value,
+                },
+            )
+            _add_error(errors, info, ValidationError({field.name: e}))
+
+
+def _check_unique(
+    infos: typing.List[_NodeInfo], errors: ErrorDict, using: typing.Optional[str]
+):
+    # (model class, unique fields) -> [(node info, field values, own pk)]
+    to_check = defaultdict(list)
+
+    for info in infos:
+        # conflicts are expected by upserts, the database resolves them
+        if info.node.is_upsert():
+            continue
+        django_obj = info.node.django_obj
+        unique_checks, date_checks = django_obj._get_unique_checks(
+            exclude=info.invalid, include_meta_constraints=True
+        )
+
+        for model_class, unique_check in unique_checks:
+            values = _get_unique_values(info, model_class, unique_check, using)
+            if values is None:
+                continue
+            if django_obj._state.adding:
+                own_pk = None
+            else:
+                own_pk = django_obj._get_pk_val(model_class._meta)
+            to_check[model_class, unique_check].append((info, values, own_pk))
+
+        if date_checks:
+            date_errors = django_obj._perform_date_checks(date_checks)
+            if date_errors:
+                _add_error(errors, info, ValidationError(date_errors))
+
+    for (model_class, unique_check), candidates in to_check.items():
+        fields = [model_class._meta.get_field(name) for name in unique_check]
+        existing = _query_existing(model_class, fields, candidates, using)
+
+        seen = set()
+        for info, values, own_pk in candidates:
+            conflicts = existing.get(values, set()) - {own_pk}
+            if values in seen or conflicts:
+                e = info.node.django_obj.unique_error_message(
+                    model_class, unique_check
+                )
+                if len(unique_check) == 1:
+                    key = unique_check[0]
+                else:
+                    key = NON_FIELD_ERRORS
+                _add_error(errors, info, ValidationError({key: e}))
+            seen.add(values)
+
+
+class _Unsaved(typing.NamedTuple):
+    # stands in for the pk of a related object that isn't saved yet
+    obj_id: int
+
+
+def _get_unique_values(
+    info: _NodeInfo,
+    model_class,
+    unique_check: typing.Tuple[str, ...],
+    using: typing.Optional[str],
+) -> typing.Optional[tuple]:
+    django_obj = info.node.django_obj
+    interprets_empty_strings_as_nulls = connections[
+        using or DEFAULT_DB_ALIAS
+    ].features.interprets_empty_strings_as_nulls
+
+    values = []
+    for field_name in unique_check:
+        field = model_class._meta.get_field(field_name)
+        try:
+            related_obj = info.linked[field_name]
+        except KeyError:
+            value = getattr(django_obj, field.attname)
+        else:
+            value = getattr(related_obj, field.target_field.attname)
+            if value is None:
+                value = _Unsaved(id(related_obj))
+        # same as `Model._perform_unique_checks()`
+        if value is None or (value == "" and interprets_empty_strings_as_nulls):
+            return None
+        if field.primary_key and not django_obj._state.adding:
+            return None
+        if not isinstance(value, _Unsaved):
+            value = field.to_python(value)
+        values.append(value)
+    return tuple(values)
+
+
+def _query_existing(
+    model_class, fields, candidates, using: typing.Optional[str]
+) -> typing.Dict[tuple, typing.Set]:
+    # rows pointing to unsaved objects can't exist yet
+    lookups = list(
+        {
+            values
+            for _, values, _ in candidates
+            if not any(isinstance(v, _Unsaved) for v in values)
+        }
+    )
+    qs = model_class._default_manager.using(using)
+    attnames = [field.attname for field in fields]
+
+    existing = defaultdict(set)
+    for i in range(0, len(lookups), QUERY_BATCH_SIZE):
+        batch = lookups[i : i + QUERY_BATCH_SIZE]
+        if len(attnames) == 1:
+            condition = Q(**{f"{attnames[0]}__in": [values[0] for values in batch]})
+        else:
+            condition = Q()
+            for values in batch:
+                condition |= Q(**dict(zip(attnames, values)))
+        for pk, *values in qs.filter(condition).values_list("pk", *attnames):
+            values = tuple(field.to_python(v) for field, v in zip(fields, values))
+            existing[values].add(pk)
+    return existing
@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+import os
+import sys
+
+import django
+from django.conf import settings
+from django.test.utils import get_runner
+
+
+def main() -> int:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "tests.settings")
+    django.setup()
+    runner = get_runner(settings)()
+    return runner.run_tests(sys.argv[1:] or ["tests"])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
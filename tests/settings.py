@@ -0,0 +1,12 @@
+SECRET_KEY = "djpb-tests"
+INSTALLED_APPS = [
+    "django.contrib.contenttypes",
+    "django.contrib.auth",
+    "djpb",
+    "tests.testapp",
+]
+DATABASES = {
+    "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+}
+DEFAULT_AUTO_FIELD = "django.db.models.AutoField"
+USE_TZ = True
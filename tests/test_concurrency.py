@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save
+from django.test import TestCase
+
+from djpb import ConcurrentUpdateError, proto_to_django
+from tests.testapp import protos
+from tests.testapp.models import Document
+
+
+class VersionedUpdateTests(TestCase):
+    def setUp(self):
+        self.doc = Document.objects.create(title="First draft")
+
+    def test_update_uses_save(self):
+        saved = []
+        receiver = lambda sender, instance, **kwargs: saved.append(instance.pk)
+        post_save.connect(receiver, sender=Document)
+        self.addCleanup(post_save.disconnect, receiver, sender=Document)
+        updated_at = self.doc.updated_at
+
+        proto_to_django(
+            protos.Document(id=self.doc.pk, title="Final Draft", version=0)
+        )
+
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.version, 1)
+        self.assertEqual(self.doc.slug, "final-draft")
+        self.assertGreater(self.doc.updated_at, updated_at)
+        self.assertEqual(saved, [self.doc.pk])
+
+    def test_stale_version(self):
+        Document.objects.filter(pk=self.doc.pk).update(version=3)
+
+        with self.assertRaises(ConcurrentUpdateError):
+            proto_to_django(protos.Document(id=self.doc.pk, title="Stale", version=0))
+
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.title, "First draft")
+        self.assertEqual(self.doc.version, 3)
@@ -0,0 +1,32 @@
+import io
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from tests.testapp.models import Catalog, Product
+
+
+class DumpLoadTests(TestCase):
+    def test_paginated_relation_is_dumped_in_full(self):
+        catalog = Catalog.objects.create(name="spring")
+        Product.objects.bulk_create(
+            [Product(catalog=catalog, name=f"p{i}") for i in range(5)]
+        )
+
+        with tempfile.TemporaryDirectory() as output:
+            call_command(
+                "djpb_dump", "testapp.Catalog", output=output, stdout=io.StringIO()
+            )
+            Catalog.objects.all().delete()
+            call_command(
+                "djpb_load",
+                os.path.join(output, "testapp.Catalog.pb"),
+                stdout=io.StringIO(),
+            )
+
+        catalog = Catalog.objects.get()
+        self.assertEqual(catalog.name, "spring")
+        # more than the page size of `products`
+        self.assertEqual(catalog.products.count(), 5)
@@ -0,0 +1,45 @@
+import io
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from djpb.delimited import write_delimited
+from djpb.drf import BulkIngestView
+from djpb.signals import post_proto_to_django_many
+from tests.testapp import protos
+from tests.testapp.models import Customer
+
+
+class CustomerIngestView(BulkIngestView):
+    model = Customer
+    batch_size = 3
+    do_full_clean = False
+
+
+class BulkIngestFallbackTests(TestCase):
+    def post(self, names):
+        body = io.BytesIO()
+        for name in names:
+            write_delimited(body, protos.Customer(name=name))
+        request = APIRequestFactory().post(
+            "/", body.getvalue(), content_type="application/x-protobuf-delimited"
+        )
+        return CustomerIngestView.as_view()(request)
+
+    def test_failed_batch_sends_many_signal_for_saved_items(self):
+        received = []
+
+        def receiver(sender, pairs, **kwargs):
+            received.extend(proto_obj.name for _, proto_obj in pairs)
+
+        post_proto_to_django_many.connect(receiver, sender=Customer)
+        self.addCleanup(post_proto_to_django_many.disconnect, receiver, sender=Customer)
+
+        # the duplicate name fails the first batch, which is then saved one by one
+        response = self.post(["a", "b", "a", "c"])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data["errors"]), [2])
+        self.assertIsNone(response.data["pks"][2])
+        self.assertEqual(sorted(received), ["a", "b", "c"])
+        self.assertEqual(Customer.objects.count(), 3)
@@ -0,0 +1,34 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from djpb import registry
+from djpb.registry import register_model, get_proto_meta
+from tests.testapp import protos
+from tests.testapp.models import Document
+
+
+class RegisterModelTests(SimpleTestCase):
+    def setUp(self):
+        # the registry is frozen once the app is ready
+        patches = [
+            mock.patch.object(registry, "_frozen", False),
+            mock.patch.dict(registry.PROTO_META),
+            mock.patch.dict(registry.PROTO_CLS_TO_MODEL),
+            mock.patch.dict(
+                registry.MODEL_TO_PROTO_CLS,
+                {Document: list(registry.MODEL_TO_PROTO_CLS[Document])},
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_register_again_keeps_proto_meta(self):
+        proto_meta = get_proto_meta(protos.Document)
+
+        register_model([protos.Document])(Document)
+
+        self.assertIs(get_proto_meta(protos.Document), proto_meta)
+        self.assertEqual(proto_meta.version_field, "version")
+        self.assertEqual(registry.MODEL_TO_PROTO_CLS[Document], [protos.Document])
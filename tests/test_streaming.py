@@ -0,0 +1,51 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from djpb import proto_to_django
+from tests.testapp import protos
+from tests.testapp.models import Customer, Item, Order
+
+
+class ChildStreamTests(TestCase):
+    def setUp(self):
+        self.order = Order.objects.create(
+            title="big", customer=Customer.objects.create(name="c1")
+        )
+        Item.objects.bulk_create(
+            [Item(order=self.order, sku=f"old{i}") for i in range(7)]
+        )
+
+    def get_proto(self, items):
+        return protos.Order(
+            id=self.order.pk,
+            title="big",
+            customer=protos.Customer(id=self.order.customer_id, name="c1"),
+            items=items,
+        )
+
+    def test_update_with_cleanup(self):
+        kept = list(self.order.items.order_by("pk")[:3])
+        items = [protos.Item(id=item.pk, sku=item.sku, qty=5) for item in kept]
+        items += [protos.Item(sku=f"new{i}") for i in range(4)]
+
+        proto_to_django(self.get_proto(items), chunk_size=2)
+
+        self.assertEqual(
+            sorted(self.order.items.values_list("sku", "qty")),
+            [("new0", 0), ("new1", 0), ("new2", 0), ("new3", 0)]
+            + [(item.sku, 5) for item in kept],
+        )
+
+    def test_cleanup_after_saving(self):
+        # a failure in the middle of the stream must not leave the parent without children
+        items = [protos.Item(sku=f"new{i}") for i in range(5)]
+
+        with CaptureQueriesContext(connection) as queries:
+            proto_to_django(self.get_proto(items), chunk_size=2)
+
+        statements = [q["sql"].split()[0] for q in queries.captured_queries]
+        last_insert = max(i for i, s in enumerate(statements) if s == "INSERT")
+        first_delete = min(i for i, s in enumerate(statements) if s == "DELETE")
+        self.assertLess(last_insert, first_delete)
+        self.assertEqual(self.order.items.count(), 5)
@@ -0,0 +1,34 @@
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+
+from djpb import proto_to_django
+from tests.testapp import protos
+from tests.testapp.models import Item, Order
+
+
+class CleanReadsLinkedForeignKeyTests(TestCase):
+    def test_nested_create(self):
+        proto_obj = protos.Order(
+            title="multi",
+            customer=protos.Customer(name="c1"),
+            items=[protos.Item(sku="a", qty=2), protos.Item(sku="b", qty=1)],
+        )
+
+        order = proto_to_django(proto_obj, do_full_clean=True)
+
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(order.customer.name, "c1")
+
+    def test_nested_create_invalid(self):
+        proto_obj = protos.Order(
+            title="single",
+            customer=protos.Customer(name="c2"),
+            items=[protos.Item(sku="a", qty=2)],
+        )
+
+        with self.assertRaises(ValidationError) as cm:
+            proto_to_django(proto_obj, do_full_clean=True)
+
+        self.assertIn("items[0].qty", cm.exception.message_dict)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Item.objects.exists())
@@ -0,0 +1,57 @@
+from django.core.exceptions import ValidationError
+from django.db import models
+
+import djpb
+from tests.testapp import protos
+
+
+@djpb.register_model([protos.Customer])
+class Customer(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+
+
+@djpb.register_model([protos.Order])
+class Order(models.Model):
+    title = models.CharField(max_length=50)
+    customer = models.ForeignKey(
+        Customer, on_delete=models.CASCADE, related_name="orders"
+    )
+
+
+@djpb.register_model([protos.Item])
+class Item(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+    sku = models.CharField(max_length=20)
+    qty = models.IntegerField(default=1)
+
+    def clean(self):
+        # reads a foreign key that is linked by the save plan
+        if self.qty > 1 and self.order.title == "single":
+            raise ValidationError(
+                {"qty": "Single orders can't have more than one item."}
+            )
+
+
+@djpb.register_model([protos.Document], djpb.ProtoMeta(version_field="version"))
+class Document(models.Model):
+    title = models.CharField(max_length=50)
+    slug = models.CharField(max_length=50, blank=True)
+    version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.slug = self.title.lower().replace(" ", "-")
+        super().save(*args, **kwargs)
+
+
+@djpb.register_model([protos.Catalog], djpb.ProtoMeta(page_sizes={"products": 2}))
+class Catalog(models.Model):
+    name = models.CharField(max_length=50)
+
+
+@djpb.register_model([protos.Product])
+class Product(models.Model):
+    catalog = models.ForeignKey(
+        Catalog, on_delete=models.CASCADE, related_name="products"
+    )
+    name = models.CharField(max_length=50)
@@ -0,0 +1,79 @@
+"""
+The protobuf messages of the test models,
+built from descriptors at import time, so no `protoc` is needed to run the tests.
+"""
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+FieldProto = descriptor_pb2.FieldDescriptorProto
+
+MESSAGES = {
+    "Customer": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("name", FieldProto.TYPE_STRING, None),
+    ],
+    "Item": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("sku", FieldProto.TYPE_STRING, None),
+        ("qty", FieldProto.TYPE_INT32, None),
+    ],
+    "Order": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("title", FieldProto.TYPE_STRING, None),
+        ("customer", FieldProto.TYPE_MESSAGE, "Customer"),
+        ("items", FieldProto.TYPE_MESSAGE, "Item[]"),
+    ],
+    "Document": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("title", FieldProto.TYPE_STRING, None),
+        ("version", FieldProto.TYPE_INT32, None),
+    ],
+    "Product": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("name", FieldProto.TYPE_STRING, None),
+    ],
+    "Catalog": [
+        ("id", FieldProto.TYPE_INT32, None),
+        ("name", FieldProto.TYPE_STRING, None),
+        ("products", FieldProto.TYPE_MESSAGE, "Product[]"),
+        ("products__next", FieldProto.TYPE_STRING, None),
+    ],
+}
+
+
+def _build_file() -> descriptor_pb2.FileDescriptorProto:
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name="djpb_tests/testapp.proto", package="djpb_tests", syntax="proto3"
+    )
+    for message_name, fields in MESSAGES.items():
+        message_proto = file_proto.message_type.add(name=message_name)
+        for number, (field_name, field_type, type_name) in enumerate(fields, 1):
+            field_proto = message_proto.field.add(
+                name=field_name,
+                number=number,
+                type=field_type,
+                label=FieldProto.LABEL_OPTIONAL,
+            )
+            if type_name is not None:
+                if type_name.endswith("[]"):
+                    type_name = type_name[:-2]
+                    field_proto.label = FieldProto.LABEL_REPEATED
+                field_proto.type_name = f".djpb_tests.{type_name}"
+    return file_proto
+
+
+_pool = descriptor_pool.DescriptorPool()
+_pool.Add(_build_file())
+
+
+def _get_message_class(name: str):
+    return message_factory.GetMessageClass(
+        _pool.FindMessageTypeByName(f"djpb_tests.{name}")
+    )
+
+
+Customer = _get_message_class("Customer")
+Item = _get_message_class("Item")
+Order = _get_message_class("Order")
+Document = _get_message_class("Document")
+Product = _get_message_class("Product")
+Catalog = _get_message_class("Catalog")